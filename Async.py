@@ -0,0 +1,62 @@
+import asyncio
+from Stackless import StacklessInterpreter
+
+
+class ProgramTask:
+    def __init__(self, tree, budget=1000, out=None, max_depth=None, tco=True, memo=None):
+        """
+        An analyzed program run on a StacklessInterpreter that hands control back to the
+        event loop every 'budget' steps, so many programs share one thread fairly.
+        pause() and resume() hold and release it between two slices, cancel() stops it there.
+        """
+        self.tree = tree
+        self.budget = budget
+        self.interpreter = StacklessInterpreter(out, max_depth, tco, memo)
+        self.slices = 0     # times control went back to the event loop
+        self.done = False
+        self._running = asyncio.Event()
+        self._running.set()
+        self._cancelled = False
+
+    @property
+    def steps(self):
+        return self.interpreter.steps
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        """stop at the end of the current slice, run() then raises asyncio.CancelledError"""
+        self._cancelled = True
+        self._running.set()
+
+    async def run(self):
+        runner = self.interpreter.run_sliced(self.tree, self.budget)
+        try:
+            while True:
+                try:
+                    next(runner)
+                except StopIteration as stop:
+                    return stop.value
+                self.slices += 1
+                await asyncio.sleep(0)  # let the other programs have a slice
+                if not self._running.is_set():
+                    await self._running.wait()
+                if self._cancelled:
+                    raise asyncio.CancelledError()
+        finally:
+            self.done = True
+            runner.close()
+            self.interpreter.out.flush()
+
+
+async def run_program(tree, budget=1000, out=None, max_depth=None, tco=True, memo=None):
+    """run an analyzed program to its end, giving the event loop a turn every 'budget' steps"""
+    return await ProgramTask(tree, budget, out, max_depth, tco, memo).run()
@@ -0,0 +1,213 @@
+from contextlib import contextmanager
+from time import perf_counter
+from Semantic import StackOverflow
+from Optimizer import BINARY
+
+
+WORD_BITS = 64          # integers up to a machine word are not charged to max_alloc
+DIGITS_PER_BIT = 0.30103    # log10(2)
+
+
+def int_digits(op, left, right):
+    """decimal digits, at most, of the int 'left op right' if it may outgrow a word, else 0"""
+    if op == '*':
+        bits = left.bit_length() + right.bit_length()
+    elif op == '+' or op == '-':
+        bits = max(left.bit_length(), right.bit_length()) + 1
+    else:   # '//' and '/' do not grow
+        return 0
+    if bits <= WORD_BITS:
+        return 0
+    return int(bits * DIGITS_PER_BIT) + 1
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, message, limit, stats):
+        """limit: 'nodes', 'depth', 'string', 'alloc' or 'timeout', stats: Budget.stats() when it was passed"""
+        super().__init__(message)
+        self.limit = limit
+        self.stats = stats
+
+
+class Budget:
+    def __init__(self, max_nodes=None, max_depth=None, max_string=None, max_alloc=None, timeout=None,
+                 check_every=1024):
+        """
+        Limits of one run, the first one passed raises BudgetExceeded.
+        max_nodes: nodes evaluated, trampoline steps on the stack engine
+        max_depth: CallStack depth
+        max_string: characters of one string built by + or *, checked before it is built
+        max_alloc: characters of all the strings built by + and *, and digits of the integers
+                   past a machine word they build, charged before they are built
+        timeout: seconds of wall clock time
+        check_every: nodes between two looks at the node count and the clock
+        """
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.max_string = max_string
+        self.max_alloc = max_alloc
+        self.timeout = timeout
+        self.check_every = check_every
+        self.nodes = 0          # nodes of the slices already ticked
+        self.allocated = 0
+        self.left = self._slice = self._next_slice()    # counted down by the interpreter, tick() at 0
+        self.call_stack = None
+        self._start = None
+        self._deadline = None
+
+    def start(self, call_stack):
+        self.call_stack = call_stack
+        self._start = perf_counter()
+        if self.timeout is not None:
+            self._deadline = self._start + self.timeout
+
+    def counts(self):
+        """whether a limit needs the Budgeted hooks, the depth alone is kept by the CallStack"""
+        return any(limit is not None for limit in (self.max_nodes, self.max_string, self.max_alloc, self.timeout))
+
+    @contextmanager
+    def running(self, call_stack):
+        """start a run on 'call_stack', a StackOverflow at the depth of the budget becomes a BudgetExceeded"""
+        self.start(call_stack)
+        try:
+            yield
+        except StackOverflow as e:
+            exceeded = self.overflow()
+            if exceeded is None:
+                raise
+            raise exceeded from e
+
+    def _next_slice(self):
+        if self.max_nodes is None:
+            return self.check_every
+        return max(1, min(self.check_every, self.max_nodes + 1 - self.nodes))
+
+    def count(self, nodes):
+        """set the node count, the stack engine counts its own steps"""
+        self.nodes = nodes
+        self.left = self._slice
+
+    def tick(self, steps=None):
+        """a slice of nodes is done, or 'steps' nodes in all for the stack engine"""
+        self.count(self.nodes + self._slice if steps is None else steps)
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise self.exceeded('nodes', 'more than {} nodes evaluated'.format(self.max_nodes))
+        if self._deadline is not None and perf_counter() > self._deadline:
+            raise self.exceeded('timeout', 'still running after {}s'.format(self.timeout))
+        self.left = self._slice = self._next_slice()
+
+    def build(self, op, left, right):
+        """check the string or large int 'left op right' would build, before building it"""
+        if type(left) is int and type(right) is int:
+            digits = int_digits(op, left, right)
+            if digits:
+                self.allocate(digits)
+            return
+        if type(left) is str:
+            if op == '+' and type(right) is str:
+                size = len(left) + len(right)
+            elif op == '*' and isinstance(right, int):
+                size = len(left) * right
+            else:
+                return
+        elif type(right) is str and op == '*' and isinstance(left, int):
+            size = len(right) * left
+        else:
+            return
+        if self.max_string is not None and size > self.max_string:
+            raise self.exceeded('string', 'a string of {} characters, over {}'.format(size, self.max_string))
+        self.allocate(max(size, 0))
+
+    def allocate(self, size):
+        self.allocated += size
+        if self.max_alloc is not None and self.allocated > self.max_alloc:
+            raise self.exceeded('alloc', '{} characters of strings and digits of integers built, over {}'.format(
+                self.allocated, self.max_alloc))
+
+    def stats(self):
+        return {
+            'nodes': self.nodes + self._slice - self.left if self.counts() else None,     # no hooks to count
+            'peak_depth': None if self.call_stack is None else self.call_stack.peak,
+            'allocated': self.allocated,
+            'seconds': None if self._start is None else perf_counter() - self._start,
+        }
+
+    def exceeded(self, limit, message):
+        return BudgetExceeded('BudgetError: {}'.format(message), limit, self.stats())
+
+    def call_stack_depth(self, max_depth):
+        """the CallStack limit for a run also capped by 'max_depth'"""
+        if self.max_depth is None:
+            return max_depth
+        if max_depth is None:
+            return self.max_depth
+        return min(max_depth, self.max_depth)
+
+    def overflow(self):
+        """BudgetExceeded for a StackOverflow at the depth of the budget, None for a tighter limit or Python's"""
+        call_stack = self.call_stack
+        if self.max_depth is not None and call_stack.max_depth == self.max_depth <= len(call_stack):
+            return self.exceeded('depth', 'call depth over {}'.format(self.max_depth))
+        return None
+
+
+class Budgeted:
+    """
+    Hooks for an Interpreter subclass enforcing a Budget: every visit counts down to the next
+    tick, the string or int a BinOp builds is sized before it is built. Bodies compiled by the Jit
+    run without visits, so a budgeted run has no Jit. The run is started by Budget.running.
+    """
+    def __init__(self, *args, budget=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = Budget() if budget is None else budget
+        self.call_stack.max_depth = self.budget.call_stack_depth(self.call_stack.max_depth)
+
+    def visit(self, node):
+        budget = self.budget
+        budget.left -= 1
+        if not budget.left:
+            budget.tick()
+        return super().visit(node)
+
+    def visit_BinOp(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        op = node.op.value
+        self.budget.build(op, left, right)
+        operation = BINARY.get(op)
+        return None if operation is None else operation(left, right)
+
+
+class BudgetedStackless:
+    """
+    Budgeted for a StacklessInterpreter: the budget is ticked between the slices of run_sliced,
+    each slice as long as the budget has left until its next tick
+    """
+    def __init__(self, *args, budget=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = Budget() if budget is None else budget
+        self.call_stack.max_depth = self.budget.call_stack_depth(self.call_stack.max_depth)
+
+    def interpret(self, tree):
+        budget = self.budget
+        runner = self.run_sliced(tree, budget.left)
+        size = None
+        try:
+            while True:
+                try:
+                    runner.send(size)
+                except StopIteration as stop:
+                    return stop.value
+                budget.tick(self.steps)
+                size = budget.left
+        except BudgetExceeded as e:     # raised inside a slice, before the steps were counted
+            e.stats['nodes'] = self.steps
+            raise
+        finally:
+            runner.close()
+            budget.count(self.steps)
+            self.out.flush()
+
+    def binary(self, op, left, right):
+        self.budget.build(op, left, right)
+        return super().binary(op, left, right)
@@ -0,0 +1,120 @@
+import gc
+import hashlib
+import os
+import pickle
+import tempfile
+
+
+def without_gc(function, *args):
+    """(un)pickling a large tree is dominated by collections triggered on every allocation burst"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return function(*args)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class ProgramCache:
+    MAGIC = b'MYLANG-AST\n'
+    SUFFIX = '.ast'
+
+    def __init__(self, directory, version, max_bytes=64 * 1024 * 1024):
+        """
+        Analyzed programs pickled under 'directory', one file per source hash.
+        version: identifies the interpreter, entries written by another version never match
+        max_bytes: total size kept on disk, least recently used entries are evicted first
+        """
+        self.directory = directory
+        self.version = version
+        self.max_bytes = max_bytes
+
+    def key(self, text):
+        digest = hashlib.sha256()
+        digest.update(self.version.encode())
+        digest.update(b'\0')
+        digest.update(text.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _header(self, key, payload):
+        return self.MAGIC + key.encode() + b'\n' + hashlib.sha256(payload).hexdigest().encode() + b'\n'
+
+    def load(self, key):
+        """the cached tree, or None on a miss or an entry that fails validation"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            magic, entry_key, checksum, payload = data.split(b'\n', 3)
+            if magic + b'\n' != self.MAGIC or entry_key.decode() != key:
+                raise ValueError('foreign cache entry')
+            if hashlib.sha256(payload).hexdigest().encode() != checksum:
+                raise ValueError('corrupted cache entry')
+            tree = without_gc(pickle.loads, payload)
+        except Exception:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # mark as recently used for eviction
+        except OSError:
+            pass
+        return tree
+
+    def store(self, key, tree):
+        try:
+            payload = without_gc(pickle.dumps, tree, pickle.HIGHEST_PROTOCOL)
+        except (RecursionError, pickle.PicklingError):
+            return False    # too deep or not picklable, just run uncached
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(self._header(key, payload))
+                    f.write(payload)
+                os.replace(tmp_path, self.path(key))     # readers see the old entry or the complete new one
+            except BaseException:
+                self._remove(tmp_path)
+                raise
+        except OSError:
+            return False
+        self.evict()
+        return True
+
+    def evict(self):
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,91 @@
+"""
+Thin client of mylang.py --serve, it only imports the standard library so it starts fast.
+
+    python Client.py --file FILE [--socket PATH] [--engine NAME] [--max-depth N] [--no-tco] [--no-opt]
+                     [--max-nodes N] [--max-string CHARS] [--max-alloc CHARS] [--timeout SECONDS]
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'mylang-{}.sock'.format(os.getuid()))
+
+
+def read_message(f):
+    """next JSON line of binary file 'f', None once the peer has closed"""
+    line = f.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def write_message(f, message):
+    f.write(json.dumps(message).encode() + b'\n')
+    f.flush()
+
+
+class Client:
+    def __init__(self, path=DEFAULT_SOCKET):
+        """connection to a server listening on the Unix socket 'path', requests are answered in order"""
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.rfile = self.socket.makefile('rb')
+        self.wfile = self.socket.makefile('wb')
+
+    def run(self, source, name='<client>', **options):
+        """
+        run 'source' on the server, options are those of mylang.run_text it accepts:
+        engine, optimize, max_depth, tco, max_nodes, max_string, max_alloc, timeout.
+        Returns {'output', 'error', 'seconds'}, and 'budget' when a limit stopped the run
+        """
+        request = dict(options, source=source, name=name)
+        write_message(self.wfile, request)
+        response = read_message(self.rfile)
+        if response is None:
+            raise Exception("ServerError: connection closed before the response")
+        return response
+
+    def close(self):
+        self.rfile.close()
+        self.wfile.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run a source file on mylang.py --serve")
+    parser.add_argument("--file", type=str, required=True)
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET)
+    parser.add_argument("--engine", choices=['tree', 'vm', 'closure', 'stack'], default="tree")
+    parser.add_argument("--max-depth", type=int)
+    parser.add_argument("--no-tco", action="store_true")
+    parser.add_argument("--no-opt", action="store_true")
+    parser.add_argument("--max-nodes", type=int)
+    parser.add_argument("--max-string", type=int)
+    parser.add_argument("--max-alloc", type=int)
+    parser.add_argument("--timeout", type=float)
+    args = parser.parse_args()
+
+    with open(args.file) as f:
+        source = f.read()
+    with Client(args.socket) as client:
+        response = client.run(source, args.file, engine=args.engine, max_depth=args.max_depth,
+                              tco=not args.no_tco, optimize=not args.no_opt, max_nodes=args.max_nodes,
+                              max_string=args.max_string, max_alloc=args.max_alloc, timeout=args.timeout)
+    sys.stdout.write(response['output'])
+    if response['error'] is not None:
+        print(response['error'], file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import gc
+from Semantic import *
+from Output import OutputChannel
+
+
+class ClosureCompiler(NodeVisitor):
+    def __init__(self, out=None, max_depth=None, tco=True):
+        """
+        Walk every AST node once and turn it into a Python closure taking the current
+        activation record, so running the program needs no visitor dispatch.
+        """
+        self.call_stack = CallStack(max_depth)
+        self.out = OutputChannel() if out is None else out
+        self.tco = tco
+        self.tail_call = None   # (function, record) left by a call in tail position for its caller to run
+
+    def compile(self, tree):
+        # allocating a closure per node keeps triggering full collections over a large AST
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self.visit(tree)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def visit_Program(self, node):
+        statements = [self.visit(statement) for statement in node.block.statements]
+        nslots = node.nslots
+        call_stack = self.call_stack
+        out = self.out
+
+        def program():
+            ar = ActivationRecord(
+                name="mylang",
+                type=ARType.PROGRAM,
+                nesting_level=1,
+                nslots=nslots,
+            )
+            call_stack.push(ar)
+            try:
+                with python_stack(call_stack):
+                    for statement in statements:    # top level results are the program output
+                        out.write(statement(ar))
+            finally:
+                out.flush()
+            call_stack.pop()
+        return program
+
+    def visit_Block(self, node):
+        statements = [self.visit(statement) for statement in node.statements]
+
+        def block(ar):
+            for statement in statements:
+                result = statement(ar)
+                if tracer.level >= TraceLevel.ALL:
+                    tracer.emit(str(result))
+        return block
+
+    def visit_NoOp(self, node):
+        return lambda ar: "No operation."
+
+    def visit_Num(self, node):
+        value = node.value
+        return lambda ar: value
+
+    visit_Bool = visit_String = visit_Num
+
+    def visit_BinOp(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        op = node.op.value
+        if op == '+':
+            return lambda ar: left(ar) + right(ar)
+        elif op == '-':
+            return lambda ar: left(ar) - right(ar)
+        elif op == '*':
+            return lambda ar: left(ar) * right(ar)
+        elif op == '/':
+            return lambda ar: left(ar) / right(ar)
+        elif op == '//':
+            return lambda ar: left(ar) // right(ar)
+        raise Exception('CompileError: unsupported operator {}'.format(node.op))
+
+    def visit_UnaryOp(self, node):
+        expr = self.visit(node.expr)
+        if node.op.value == '-':
+            return lambda ar: -expr(ar)
+        return lambda ar: +expr(ar)
+
+    def visit_Var(self, node):
+        var_name = node.value
+        depth, slot = node.depth, node.slot
+
+        if depth == 0:
+            def var(ar):
+                var_value = ar.slots[slot]
+                if var_value is None:   # right now, 'None' is not assignable
+                    raise Exception("Undefined identifier: " + var_name)
+                return var_value
+        else:
+            def var(ar):
+                var_value = ar.outer(depth).slots[slot]
+                if var_value is None:
+                    raise Exception("Undefined identifier: " + var_name)
+                return var_value
+        return var
+
+    def visit_Assign(self, node):
+        var_name = node.left.value
+        depth, slot = node.depth, node.slot
+        right = self.visit(node.right)
+
+        def assign(ar):
+            var_value = right(ar)
+            ar.outer(depth).slots[slot] = var_value
+            return "Assign {} with {}".format(var_name, var_value)
+        return assign
+
+    def visit_Defun(self, node):
+        proc_name = node.token.value
+        formal_params = node.formal_params
+        slot, nslots = node.slot, node.nslots
+        block_ast = node.block
+        block_ast.closure = self.visit(block_ast)     # compiled once, cached on the Defun block
+        message = "define {}".format(proc_name)
+
+        def defun(ar):
+            proc_symbol = FunSymbol(proc_name)
+            proc_symbol.formal_params = formal_params
+            proc_symbol.block_ast = block_ast
+            proc_symbol.nslots = nslots
+            proc_symbol.access_link = ar
+            ar.slots[slot] = proc_symbol
+            return message
+        return defun
+
+    def visit_FunCall(self, node):
+        proc_name = node.token.value
+        depth, slot = node.depth, node.slot
+        arguments = [self.visit(param) for param in node.actual_params]
+        message = "Call {}, params {}".format(proc_name, node.actual_params)
+        call_stack = self.call_stack
+        compiler = self
+
+        if node.tail and self.tco:
+            def tail_call(ar):
+                proc_symbol = ar.outer(depth).slots[slot]
+                callee = ActivationRecord(
+                    name=proc_name,
+                    type=ARType.PROCEDURE,
+                    nesting_level=proc_symbol.scope_level + 1,
+                    nslots=proc_symbol.nslots,
+                    enclosing=proc_symbol.access_link,
+                )
+                slots = callee.slots
+                for param, argument in zip(proc_symbol.formal_params, arguments):
+                    slots[param.slot] = argument(ar)
+                compiler.tail_call = (proc_symbol, callee)
+                return message
+            return tail_call
+
+        def fun_call(ar):
+            proc_symbol = ar.outer(depth).slots[slot]
+            callee = ActivationRecord(
+                name=proc_name,
+                type=ARType.PROCEDURE,
+                nesting_level=proc_symbol.scope_level + 1,
+                nslots=proc_symbol.nslots,
+                enclosing=proc_symbol.access_link,
+            )
+            slots = callee.slots
+            for param, argument in zip(proc_symbol.formal_params, arguments):
+                slots[param.slot] = argument(ar)
+            call_stack.push(callee)
+            proc_symbol.block_ast.closure(callee)
+            while compiler.tail_call is not None:
+                proc_symbol, callee = compiler.tail_call
+                compiler.tail_call = None
+                call_stack.replace(callee)
+                proc_symbol.block_ast.closure(callee)
+            call_stack.pop()
+            return message
+        return fun_call
+
+    def visit_Condition(self, node):
+        pairs = [(self.visit(pair.cond), self.visit(pair.block)) for pair in node.pair_list]
+        else_block = None if node.else_block is None else self.visit(node.else_block)
+
+        def condition(ar):
+            for cond, block in pairs:
+                if cond(ar) not in FALSY:
+                    return block(ar)
+            if else_block is not None:
+                return else_block(ar)
+        return condition
@@ -0,0 +1,141 @@
+import re
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from operator import attrgetter
+from Parser import *
+
+
+LINE = attrgetter('ln')
+
+
+def line_starts(text):
+    """offset of the first character of every line, line n starts at [n - 1]"""
+    return [0] + [m.end() for m in re.finditer('\n', text)]
+
+
+def common_edit(old, new):
+    """(offset, removed, inserted) turning 'old' into 'new', the unchanged head and tail are left out"""
+    end = min(len(old), len(new))
+    offset = 0
+    while offset < end and old[offset] == new[offset]:
+        offset += 1
+    tail = 0
+    while tail < end - offset and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    return offset, len(old) - offset - tail, new[offset:len(new) - tail]
+
+
+class IncrementalParser:
+    def __init__(self, text):
+        """
+        Front end for a text edited again and again (--watch): an edit lexes only the lines it
+        touches and parses only the top level statements of Program.block those lines belong to,
+        the other statements are kept with their subtrees and tokens.
+        """
+        self.text = text
+        self.relexed = 0    # tokens lexed by the last edit
+        self.reparsed = 0   # top level statements parsed by the last edit
+        self.reused = 0     # top level statements kept by the last edit
+        self._rebuild()
+
+    def _rebuild(self):
+        self._starts = None
+        self._records = None    # cleared first, so a text that fails to parse is rebuilt next time
+        tokens = list(RegexLexer(self.text).tokens())
+        self._records = list(Parser('', tokens=tokens).statements())   # (node, first token, last token)
+        self._tokens = tokens
+        self._starts = line_starts(self.text)
+        self.relexed = len(tokens)
+        self.reparsed = len(self._records)
+        self.reused = 0
+
+    def program(self):
+        """a new Program over the current statements, ready for SemanticAnalyzer"""
+        return Program(Block([node for node, first, last in self._records]))
+
+    def update(self, text):
+        """replace the whole text, only the part that differs is lexed and parsed again"""
+        return self.edit(*common_edit(self.text, text))
+
+    def edit(self, offset, removed, inserted):
+        """replace text[offset:offset + removed] by 'inserted', return the new Program"""
+        old = self.text
+        self.text = old[:offset] + inserted + old[offset + removed:]
+        if self._records is None:   # the last edit left a text that did not parse
+            self._rebuild()
+            return self.program()
+        try:
+            self._edit(old, offset, removed, inserted)
+        except Exception:
+            self._records = None
+            raise
+        return self.program()
+
+    def _end_line(self, text, starts, token):
+        """line of the last character of 'token', strings may run over several lines"""
+        if token.type != 'STRING':
+            return token.ln
+        offset = starts[token.ln - 1] + token.col - 1
+        return token.ln + text.count('\n', offset, RegexLexer.MASTER.match(text, offset).end())
+
+    def _edit(self, old, offset, removed, inserted):
+        text, tokens, starts = self.text, self._tokens, self._starts
+        # damaged lines of the old text, widened to whole tokens
+        first = bisect_right(starts, offset)
+        last = bisect_right(starts, offset + removed)
+        a = bisect_left(tokens, first, key=LINE)
+        if a and self._end_line(old, starts, tokens[a - 1]) >= first:
+            first = tokens[a - 1].ln
+            a = bisect_left(tokens, first, key=LINE)
+        b = bisect_right(tokens, last, key=LINE)
+        if b > a:
+            last = max(last, self._end_line(old, starts, tokens[b - 1]))
+            b = bisect_right(tokens, last, key=LINE)
+        delta = inserted.count('\n') - old.count('\n', offset, offset + removed)
+        # statements ending before the damaged lines stay, so do the ones after them once parsing meets one again
+        records = self._records
+        i = bisect_left(records, first, key=lambda record: record[2].ln)
+        j = bisect_right(records, last, key=lambda record: record[1].ln)
+
+        new_starts = line_starts(text)
+        new_last = last + delta
+        at_end = new_last >= len(new_starts)
+        region = text[new_starts[first - 1]:len(text) if at_end else new_starts[new_last]]
+        try:
+            relexed = list(RegexLexer(region).tokens())
+        except Exception:   # a quote opened or closed across the region, let the whole text decide
+            self._rebuild()
+            return
+        if not at_end:
+            relexed.pop()   # the EOF of the region, the old one still ends the text
+        for token in relexed:
+            token.ln += first - 1
+        if delta:
+            for token in islice(tokens, b, None):
+                token.ln += delta
+        self._tokens = tokens = tokens[:a] + relexed + tokens[b:]
+        self._starts = new_starts
+        self.relexed = len(relexed)
+
+        if i < j and records[i][1].ln < first:     # a statement running into the damaged lines
+            start_token = records[i][1]
+            start = bisect_left(tokens, start_token.ln, key=LINE)
+            while tokens[start] is not start_token:
+                start += 1
+        else:
+            start = a
+        parser = Parser('', tokens=islice(tokens, start, None))
+        reparsed = []
+        k = j
+        for record in parser.statements():
+            reparsed.append(record)
+            token = parser.token
+            while k < len(records) and (records[k][1].ln, records[k][1].col) < (token.ln, token.col):
+                k += 1
+            if k < len(records) and records[k][1] is token:
+                break
+        else:
+            k = len(records)
+        self._records = records[:i] + reparsed + records[k:]
+        self.reparsed = len(reparsed)
+        self.reused = len(self._records) - len(reparsed)
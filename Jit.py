@@ -0,0 +1,154 @@
+import math
+import sys
+from Semantic import *
+
+
+BINARY = ('+', '-', '*', '/', '//')
+
+
+def undefined(var_name):
+    raise Exception("Undefined identifier: " + var_name)
+
+
+class PythonTranslator(NodeVisitor):
+    def __init__(self, name):
+        """
+        Translate a function body to the source of a Python function of its activation record.
+        Expressions become Python expressions; calls, nested definitions and anything else
+        without a translation are handed back to the interpreter as visit(nodes[i]).
+        """
+        self.name = name
+        self.lines = []
+        self.nodes = []     # AST nodes the generated code passes back to visit()
+        self.indent = 1
+
+    def translate(self, block):
+        self.lines = ['def jit_{}(ar):'.format(self.name), '    slots = ar.slots']
+        self.body(block)
+        return '\n'.join(self.lines) + '\n'
+
+    def emit(self, line):
+        self.lines.append('    ' * self.indent + line)
+
+    def body(self, block):
+        if not block.statements:
+            self.emit('pass')
+        for statement in block.statements:
+            self.statement(statement)
+            self.emit('if tracer.level >= ALL:')
+            self.emit('    tracer.emit(str(result))')
+
+    def statement(self, node):
+        """code leaving the value of the statement in 'result'"""
+        if isinstance(node, Condition):
+            keyword = 'if'
+            for pair in node.pair_list:
+                self.emit('{} {} not in FALSY:'.format(keyword, self.visit(pair.cond)))
+                self.indent += 1
+                self.body(pair.block)
+                self.indent -= 1
+                keyword = 'elif'
+            if node.else_block is not None and not node.pair_list:     # every pair pruned by ConstantFolder
+                self.body(node.else_block)
+            elif node.else_block is not None:
+                self.emit('else:')
+                self.indent += 1
+                self.body(node.else_block)
+                self.indent -= 1
+            self.emit('result = None')
+        elif isinstance(node, Assign):
+            self.emit('value = {}'.format(self.visit(node.right)))
+            slots = 'slots' if node.depth == 0 else self.record(node.depth) + '.slots'
+            self.emit('{}[{}] = value'.format(slots, node.slot))
+            self.emit('result = {}.format(value)'.format(repr('Assign {} with {{}}'.format(node.left.value))))
+        else:
+            self.emit('result = {}'.format(self.visit(node)))
+
+    @staticmethod
+    def record(depth):
+        return 'ar' + '.enclosing' * depth
+
+    def fallback(self, node):
+        self.nodes.append(node)
+        return 'visit(nodes[{}])'.format(len(self.nodes) - 1)
+
+    def generic_visit(self, node):
+        return self.fallback(node)
+
+    def visit_Num(self, node):
+        value = node.value
+        if type(value) is float and not math.isfinite(value):    # repr() gives inf and nan, not Python names
+            return 'float({!r})'.format(repr(value))
+        return repr(value)
+
+    def visit_Bool(self, node):
+        return repr(node.value)
+
+    visit_String = visit_Bool
+
+    def visit_NoOp(self, node):
+        return repr("No operation.")
+
+    def visit_Var(self, node):
+        slots = 'slots' if node.depth == 0 else self.record(node.depth) + '.slots'
+        # right now, 'None' is not assignable
+        return '(v if (v := {}[{}]) is not None else undefined({!r}))'.format(slots, node.slot, node.value)
+
+    def visit_BinOp(self, node):
+        if node.op.value not in BINARY:
+            return self.fallback(node)
+        return '({} {} {})'.format(self.visit(node.left), node.op.value, self.visit(node.right))
+
+    def visit_UnaryOp(self, node):
+        if node.op.value not in ('+', '-'):
+            return self.fallback(node)
+        return '({}{})'.format(node.op.value, self.visit(node.expr))
+
+
+class Jit:
+    def __init__(self, threshold=100, dump=False):
+        """
+        Tier-up for Interpreter: a function called 'threshold' times has its body translated
+        to Python and compiled, later calls run the compiled body.
+        dump: write the generated source of every compiled body to stderr
+        """
+        self.threshold = threshold
+        self.dump = dump
+        self.bodies = {}    # Block -> compiled body, or None when it could not be compiled
+
+    def run(self, interpreter, proc_symbol, ar):
+        body = proc_symbol.jit
+        if body is None:
+            proc_symbol.calls += 1
+            if proc_symbol.calls < self.threshold:
+                return interpreter.visit(proc_symbol.block_ast)
+            body = proc_symbol.jit = self.compile(interpreter, proc_symbol) or False
+        if body is False:
+            return interpreter.visit(proc_symbol.block_ast)
+        return body(ar)
+
+    def compile(self, interpreter, proc_symbol):
+        block = proc_symbol.block_ast
+        if block in self.bodies:    # the same Defun run again defines a new FunSymbol
+            return self.bodies[block]
+        translator = PythonTranslator(proc_symbol.name)
+        source = translator.translate(block)
+        namespace = {
+            'ALL': TraceLevel.ALL,
+            'FALSY': FALSY,
+            'nodes': translator.nodes,
+            'tracer': tracer,
+            'undefined': undefined,
+            'visit': interpreter.visit,
+        }
+        try:
+            exec(compile(source, '<jit {}>'.format(proc_symbol.name), 'exec'), namespace)
+            body = namespace['jit_' + proc_symbol.name]
+        except (SyntaxError, RecursionError, MemoryError):   # nested too deep for Python's compiler
+            body = None
+        if self.dump:
+            status = 'compiled' if body is not None else 'not compiled, stays interpreted'
+            print('# jit: {} after {} calls, {}\n{}'.format(proc_symbol.name, proc_symbol.calls, status, source),
+                  file=sys.stderr)
+        self.bodies[block] = body
+        return body
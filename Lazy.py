@@ -0,0 +1,25 @@
+from Semantic import *
+from Optimizer import ConstantFolder
+
+
+def parse_body(node):
+    """parse, analyze and optimize the skimmed body of 'node', once"""
+    lazy = node.lazy
+    node.block = Parser('', tokens=lazy.tokens, lazy=True).function_body()
+    analyzer = SemanticAnalyzer()
+    analyzer.current_scope = lazy.scope
+    analyzer.calls[lazy.symbol] = set()
+    analyzer.analyze_body(node, lazy.symbol)
+    if lazy.optimize:
+        ConstantFolder().visit(node.block)
+    node.lazy = None    # drops the tokens and the analysis scope
+
+
+def materialize(proc_symbol):
+    """give a function defined from a lazy Defun its body, on its first call"""
+    node = proc_symbol.lazy
+    if node.block is None:  # another definition by the same Defun may have parsed it already
+        parse_body(node)
+    proc_symbol.block_ast = node.block
+    proc_symbol.nslots = node.nslots
+    proc_symbol.lazy = None
@@ -1,7 +1,14 @@
+import re
+
+
 class Token:
-    def __init__(self, type, value):
+    __slots__ = ('type', 'value', 'ln', 'col')
+
+    def __init__(self, type, value, ln=None, col=None):
         self.type = type
         self.value = value
+        self.ln = ln    # line number
+        self.col = col  # column
 
     def __str__(self):
         return 'Token({type}, {value})'.format(
@@ -52,14 +59,6 @@ class Lexer:
         else:
             return self.text[peek_pos]
 
-    def peek_token(self):
-        pos = self.pos
-        ch = self.ch
-        token = self.next_token()
-        self.pos = pos
-        self.ch = ch
-        return token
-
     def identifier(self):
         result = ''
         while self.pos < len(self.text) and self.ch.isalnum():
@@ -157,6 +156,176 @@ class Lexer:
 
         raise Exception('LexerError: unexpected token on line:{} col:{}'.format(self.ln, self.col))
 
+    def tokens(self):
+        """generate every token of the text, EOF included"""
+        while True:
+            self.skip_whitespace()
+            self.skip_comment()
+            ln, col = self.ln, self.col
+            token = self.next_token()
+            token.ln, token.col = ln, col
+            yield token
+            if token.type == 'EOF':
+                return
+
+
+class RegexLexer:
+    """
+    Single pass lexer: one compiled master regex slices every lexeme out of the source,
+    so no lexeme is built character by character.
+    """
+    KEYWORDS = {
+        'def': ('DEF', None), 'return': ('RETURN', None), 'end': ('END', None),
+        'if': ('IF', None), 'then': ('THEN', None), 'elif': ('ELIF', None), 'else': ('ELSE', None),
+        'true': ('BOOL', True), 'false': ('BOOL', False),
+    }
+    ESCAPES = {'"': '"', '\\': '\\', 'n': '\n'}
+    MASTER = re.compile('|'.join('(?P<{}>{})'.format(*pair) for pair in [
+        ('NEWLINE', r'\n'),
+        ('SKIP', r'[^\S\n]+'),                    # whitespace except new line
+        ('COMMENT', r'#[^\n]*'),
+        ('NUMBER', r'\d+(?:\.\d*)?'),
+        ('NAME', r'[^\W\d_][^\W_]*'),             # alpha, then alnum
+        ('STRING', r'"(?:[^"\\]|\\[\s\S])*"'),
+        ('OP', r'//|\*\*|==|\|\||&&|[-+*/=;:!]'),
+        ('PUNCT', r'[(),]'),
+        ('QUOTE', r'"'),                          # string literal without the right quotation
+        ('ERROR', r'.'),
+    ]))
+
+    def __init__(self, text):
+        self.text = text
+
+    def tokens(self):
+        """generate every token of the text, EOF included"""
+        text = self.text
+        pos, ln, line_start = yield from self.scan(text, 0, len(text), 1, 0, True)
+        yield Token('EOF', None, ln, len(text) - line_start + 1)
+
+    def scan(self, text, pos, endpos, ln, line_start, final):
+        """
+        tokens of text[pos:endpos], EOF left out, then returns (pos, ln, line_start) to resume from.
+        final: text ends at endpos, otherwise a string literal still open at endpos stops the scan
+               at its left quotation, to be resumed once more text has been read
+        """
+        keywords = self.KEYWORDS
+        for m in self.MASTER.finditer(text, pos, endpos):
+            kind = m.lastgroup
+            start = m.start()
+            if kind == 'SKIP' or kind == 'COMMENT':
+                continue
+            col = start - line_start + 1
+            if kind == 'NAME':
+                name = m.group()
+                if name in keywords:
+                    type, value = keywords[name]
+                    yield Token(type, value, ln, col)
+                else:
+                    yield Token('IDENT', name, ln, col)
+            elif kind == 'OP':
+                yield Token('OP', m.group(), ln, col)
+            elif kind == 'NEWLINE':
+                yield Token('NEWLINE', '\n', ln, col)
+                ln += 1
+                line_start = m.end()
+            elif kind == 'NUMBER':
+                lexeme = m.group()
+                if '.' in lexeme:
+                    yield Token('FLT', float(lexeme), ln, col)
+                else:
+                    yield Token('INT', int(lexeme), ln, col)
+            elif kind == 'PUNCT':
+                yield Token(m.group(), None, ln, col)
+            elif kind == 'STRING':
+                body = text[start + 1:m.end() - 1]
+                if '\\' in body:
+                    body = re.sub(r'\\([\s\S])', self._unescape, body)
+                yield Token('STRING', body, ln, col)
+                newlines = text.count('\n', start, m.end())
+                if newlines:
+                    ln += newlines
+                    line_start = text.rfind('\n', start, m.end()) + 1
+            elif kind == 'QUOTE':
+                if not final:
+                    return start, ln, line_start
+                raise Exception("LexerError: EOF while scanning the string literal, line:{} col:{}".format(ln, col))
+            else:
+                raise Exception('LexerError: unexpected token on line:{} col:{}'.format(ln, col))
+        return endpos, ln, line_start
+
+    def _unescape(self, m):
+        ch = m.group(1)
+        return self.ESCAPES.get(ch, ch)
+
+
+class StreamLexer(RegexLexer):
+    def __init__(self, file, chunk_size=1 << 16):
+        """
+        RegexLexer over a file read 'chunk_size' characters at a time, only the lines of the
+        current chunk (and of a string literal running over several chunks) are held in memory
+        """
+        self.file = file
+        self.chunk_size = chunk_size
+
+    def tokens(self):
+        text = ''
+        pos = 0
+        ln = 1
+        line_start = 0
+        while True:
+            chunk = self.file.read(self.chunk_size)
+            final = not chunk
+            text = text[pos:] + chunk     # the unscanned rest of the last chunk, then the new one
+            line_start -= pos
+            pos = 0
+            endpos = len(text) if final else text.rfind('\n') + 1     # a line is only scanned whole
+            pos, ln, line_start = yield from self.scan(text, pos, endpos, ln, line_start, final)
+            if final:
+                break
+        yield Token('EOF', None, ln, len(text) - line_start + 1)
+
+
+class TokenStream:
+    """
+    Token iterator with a ring buffer for k-token lookahead,
+    every token is produced by the lexer exactly once.
+    """
+    def __init__(self, tokens, lookahead=2):
+        self._tokens = iter(tokens)
+        self._size = lookahead
+        self._ring = [None] * lookahead
+        self._head = 0      # ring index of the next token
+        self._count = 0     # number of buffered tokens
+        self._eof = None
+
+    def _pull(self):
+        token = next(self._tokens, None)
+        if token is None:   # keep answering EOF once the lexer is exhausted
+            return self._eof
+        if token.type == 'EOF':
+            self._eof = token
+        return token
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._count:
+            token = self._ring[self._head]
+            self._head = (self._head + 1) % self._size
+            self._count -= 1
+            return token
+        return self._pull()
+
+    def peek(self, k=1):
+        """the k-th token ahead (1-based) without consuming it"""
+        if not 0 < k <= self._size:
+            raise ValueError('lookahead {} out of range 1..{}'.format(k, self._size))
+        while self._count < k:
+            self._ring[(self._head + self._count) % self._size] = self._pull()
+            self._count += 1
+        return self._ring[(self._head + k - 1) % self._size]
+
 
 # lex = Lexer('1+$"+1"\n2+2')
 # token = lex.next_token()
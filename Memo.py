@@ -0,0 +1,57 @@
+from collections import OrderedDict
+
+
+def memo_key(arguments):
+    """argument values tagged with their type, 1, 1.0 and True are different calls"""
+    return tuple((type(value), value) for value in arguments)
+
+
+class LRUCache:
+    def __init__(self, capacity=128, counters=None):
+        """
+        Results of one pure function, the least recently used entry goes first once 'capacity' is reached.
+        counters: [hits, misses] list to count into, shared by every definition of the same function
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.counters = [0, 0] if counters is None else counters
+
+    @property
+    def hits(self):
+        return self.counters[0]
+
+    @property
+    def misses(self):
+        return self.counters[1]
+
+    def __contains__(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.counters[0] += 1
+            return True
+        self.counters[1] += 1
+        return False
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class Memoizer:
+    def __init__(self, capacity=128):
+        """hands out one LRUCache per pure function definition and keeps hit/miss totals by name"""
+        self.capacity = capacity
+        self.counters = {}      # function name -> [hits, misses]
+
+    def cache(self, name):
+        return LRUCache(self.capacity, self.counters.setdefault(name, [0, 0]))
+
+    def report(self):
+        if not self.counters:
+            return 'memo: no pure function was defined'
+        return '\n'.join('memo: {}: {} hits, {} misses'.format(name, hits, misses)
+                         for name, (hits, misses) in self.counters.items())
@@ -0,0 +1,126 @@
+import operator
+from Lexer import Token
+from Semantic import *
+
+
+BINARY = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv, '//': operator.floordiv}
+UNARY = {'+': operator.pos, '-': operator.neg}
+CONSTANTS = (Num, String, Bool)
+MAX_FOLDED_STRING = 4096    # longer string results stay as expressions instead of bloating the tree
+
+
+def repeats_too_long(left, right):
+    """str * int that would build a string longer than MAX_FOLDED_STRING"""
+    if isinstance(left, int) and isinstance(right, str):
+        left, right = right, left
+    return isinstance(left, str) and isinstance(right, int) and len(left) * right > MAX_FOLDED_STRING
+
+
+def constant(value, token):
+    """AST leaf for a folded value, positioned at 'token'"""
+    if isinstance(value, bool):
+        return Bool(Token('BOOL', value, token.ln, token.col))
+    if isinstance(value, str):
+        return String(Token('STRING', value, token.ln, token.col))
+    if isinstance(value, float):
+        return Num(Token('FLT', value, token.ln, token.col))
+    return Num(Token('INT', value, token.ln, token.col))
+
+
+class ConstantFolder(NodeVisitor):
+    def __init__(self):
+        """
+        Runs between SemanticAnalyzer and execution:
+            folds constant Num/String/Bool expressions, drops NoOp statements
+            from nested blocks and prunes if/elif branches with a constant condition
+        """
+        self.stats = {'folded': 0, 'noops': 0, 'branches': 0}
+
+    def optimize(self, tree):
+        return self.visit(tree)
+
+    def visit_Program(self, node):
+        block = node.block
+        # top level NoOps stay, their "No operation." results are program output
+        block.statements = [self.visit(statement) for statement in block.statements]
+        return node
+
+    def visit_Block(self, node):
+        statements = []
+        for statement in node.statements:
+            if isinstance(statement, NoOp):
+                self.stats['noops'] += 1
+                continue
+            statements.append(self.visit(statement))
+        node.statements = statements
+        return node
+
+    def visit_Num(self, node):
+        return node
+
+    visit_Bool = visit_String = visit_Var = visit_NoOp = visit_Num
+
+    def visit_BinOp(self, node):
+        node.left = left = self.visit(node.left)
+        node.right = right = self.visit(node.right)
+        if not (isinstance(left, CONSTANTS) and isinstance(right, CONSTANTS)):
+            return node
+        op = node.op.value
+        if op == '*' and repeats_too_long(left.value, right.value):
+            return node
+        try:
+            value = BINARY[op](left.value, right.value)
+        except (KeyError, ArithmeticError, TypeError):
+            return node     # leave the error to runtime, where the program would raise it
+        if isinstance(value, str) and len(value) > MAX_FOLDED_STRING:
+            return node
+        self.stats['folded'] += 1
+        return constant(value, node.op)
+
+    def visit_UnaryOp(self, node):
+        node.expr = expr = self.visit(node.expr)
+        if not isinstance(expr, CONSTANTS):
+            return node
+        try:
+            value = UNARY[node.op.value](expr.value)
+        except (KeyError, TypeError):
+            return node
+        self.stats['folded'] += 1
+        return constant(value, node.op)
+
+    def visit_Assign(self, node):
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_Defun(self, node):
+        if node.block is None:  # folded once Lazy.materialize has parsed it
+            node.lazy.optimize = True
+            return node
+        self.visit(node.block)
+        return node
+
+    def visit_FunCall(self, node):
+        node.actual_params = [self.visit(param) for param in node.actual_params]
+        return node
+
+    def visit_Condition(self, node):
+        pair_list = []
+        for i, pair in enumerate(node.pair_list):
+            pair.cond = self.visit(pair.cond)
+            if isinstance(pair.cond, CONSTANTS):
+                if pair.cond.value in FALSY:     # never taken
+                    self.stats['branches'] += 1
+                    continue
+                # always taken, nothing after it can run
+                pair_list.append(pair)
+                self.visit(pair.block)
+                self.stats['branches'] += len(node.pair_list) - i - 1 + (node.else_block is not None)
+                node.pair_list = pair_list
+                node.else_block = None
+                return node
+            self.visit(pair.block)
+            pair_list.append(pair)
+        node.pair_list = pair_list
+        if node.else_block is not None:
+            self.visit(node.else_block)
+        return node
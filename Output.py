@@ -0,0 +1,39 @@
+import io
+import sys
+
+
+class OutputChannel:
+    def __init__(self, stream=None, buffer_size=8192):
+        """
+        Buffered writer for program results.
+        stream: file object the buffer is flushed into, sys.stdout (looked up at flush time) if None
+        buffer_size: characters collected before flushing, 0 writes every result through
+        """
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self._chunks = []
+        self._size = 0
+
+    @classmethod
+    def memory(cls):
+        """capture the output in memory, read it back with getvalue()"""
+        return cls(io.StringIO(), buffer_size=sys.maxsize)
+
+    def write(self, value):
+        text = '%s\n' % (value,)
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        stream = sys.stdout if self.stream is None else self.stream
+        if self._chunks:
+            stream.write(''.join(self._chunks))
+            self._chunks = []
+            self._size = 0
+        stream.flush()
+
+    def getvalue(self):
+        self.flush()
+        return self.stream.getvalue()
@@ -1,112 +1,196 @@
-from Lexer import Lexer
+from Lexer import Lexer, RegexLexer, Token, TokenStream
 
 
 class AST:
-    """Abstract Syntax Tree"""
-    pass
+    """Abstract Syntax Tree, every node class lists all its attributes, annotations included, in __slots__"""
+    __slots__ = ()
 
 
 class BinOp(AST):
+    __slots__ = ('left', 'token', 'op', 'right', 'inline')
+
     def __init__(self, left, op, right):
         self.left = left
         self.token = self.op = op
         self.right = right
+        # no call below, set by StacklessInterpreter the first time it evaluates the node
+        self.inline = None
 
 
 class UnaryOp(AST):
+    __slots__ = ('op', 'expr', 'inline')
+
     def __init__(self, op, expr):
         self.op = op
         self.expr = expr
+        self.inline = None  # as BinOp.inline
 
 
 class Num(AST):
+    __slots__ = ('token',)
+
     def __init__(self, token):
         """INT | FLT"""
         self.token = token
-        self.value = token.value
+
+    @property
+    def value(self):
+        return self.token.value
 
 
 class Bool(AST):
+    __slots__ = ('token',)
+
     def __init__(self, token):
         self.token = token
-        self.value = token.value
+
+    @property
+    def value(self):
+        return self.token.value
 
 
 class String(AST):
+    __slots__ = ('token',)
+
     def __init__(self, token):
         self.token = token
-        self.value = token.value
+
+    @property
+    def value(self):
+        return self.token.value
 
 
 class Program(AST):
+    __slots__ = ('block', 'nslots')
+
     def __init__(self, block):
         self.block = block
+        self.nslots = 0     # global variables and functions, set by SemanticAnalyzer
 
 
 class Block(AST):
+    __slots__ = ('statements', 'closure')
+
     def __init__(self, statements):
         self.statements = statements
+        # a function body compiled by ClosureCompiler
+        self.closure = None
 
 
 class NoOp(AST):
-    pass
+    __slots__ = ()
 
 
 class Assign(AST):
+    __slots__ = ('left', 'op', 'right', 'depth', 'slot')
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
         self.right = right
+        # lexical address set by SemanticAnalyzer: scopes to go up, slot in that scope
+        self.depth = None
+        self.slot = None
 
 
 class Var(AST):
+    __slots__ = ('token', 'depth', 'slot')
+
     def __init__(self, token):
         self.token = token
-        self.value = token.value    # var_name
+        # lexical address set by SemanticAnalyzer: scopes to go up, slot in that scope
+        self.depth = None
+        self.slot = None
+
+    @property
+    def value(self):    # var_name
+        return self.token.value
 
 
 class Defun(AST):
+    __slots__ = ('token', 'formal_params', 'block', 'slot', 'nslots', 'pure', 'lazy')
+
     def __init__(self, token, formal_params, block):
         self.token = token
         self.formal_params = formal_params
         self.block = block
+        self.slot = None    # slot of the function in the enclosing scope
+        self.nslots = 0     # parameters and locals, set by SemanticAnalyzer
+        self.pure = False   # touches nothing outside its own record, set by SemanticAnalyzer
+        self.lazy = None    # LazyBody while 'block' is still unparsed
 
 
 class Param(AST):
+    __slots__ = ('token', 'slot')
+
     def __init__(self, token):
         self.token = token
+        self.slot = None
 
 
 class FunCall(AST):
+    __slots__ = ('token', 'actual_params', 'proc_symbol', 'depth', 'slot', 'tail')
+
     def __init__(self, token, actual_params):
         self.token = token
         self.actual_params = actual_params
         # a reference to procedure declaration symbol
         self.proc_symbol = None
+        # lexical address of the function set by SemanticAnalyzer
+        self.depth = None
+        self.slot = None
+        # set by SemanticAnalyzer when the call is the last thing its function does
+        self.tail = False
 
 
 class CondPair(AST):
+    __slots__ = ('cond', 'block')
+
     def __init__(self, cond, block):
         self.cond = cond
         self.block = block
 
 
 class Condition(AST):
+    __slots__ = ('pair_list', 'else_block')
+
     def __init__(self, pair_list, else_block):
         self.pair_list = pair_list
         self.else_block = else_block
 
 
+class LazyBody:
+    __slots__ = ('tokens', 'scope', 'symbol', 'optimize')
+
+    def __init__(self, tokens):
+        """
+        body of a Defun skimmed by a lazy Parser, parsed and analyzed on the first call;
+        until then it is only lexed and matched to its END, a syntax or name error in a body
+        that is never called is never reported
+        """
+        self.tokens = tokens    # from the first token of the body to its END, then EOF
+        self.scope = None       # snapshot of the enclosing ScopedSymbolTable at the def, set by SemanticAnalyzer
+        self.symbol = None      # FunSymbol of the analysis, set by SemanticAnalyzer
+        self.optimize = False   # run ConstantFolder on the body too, set by ConstantFolder
+
+
 class Parser:
-    def __init__(self, text):
-        self.lex = Lexer(text)
-        self.token = self.lex.next_token()
+    def __init__(self, text, lexer=RegexLexer, tokens=None, lazy=False):
+        """
+        lexer: RegexLexer (single pass) or Lexer (char by char, kept for comparison)
+        tokens: tokens of 'text' lexed beforehand, ending with EOF, instead of lexing on demand
+        lazy: only skim function bodies to their END, see LazyBody
+        """
+        self.lex = lexer(text) if tokens is None else None
+        self.lazy = lazy
+        self.tokens = TokenStream(self.lex.tokens() if tokens is None else iter(tokens))
+        self.token = next(self.tokens)
 
     def eat(self, token_type):
         """check type and advance"""
         # print(self.token)
         if self.token.type == token_type or token_type == 'ANY':
-            self.token = self.lex.next_token()
+            self.token = next(self.tokens)
         else:
             raise Exception('ParserError: expected {}, got {}'.format(token_type, self.token))
 
@@ -115,6 +199,23 @@ class Parser:
         self.eat('EOF')
         return p
 
+    def statements(self):
+        """
+        top level statements one at a time, as (node, first token, last token),
+        the ';' or NEWLINE ending a statement is its last token, EOF is left uneaten
+        """
+        while self.token.type != 'EOF':
+            first = self.token
+            node = self.statement()
+            last = self.token
+            if self.token.value == ';':
+                self.eat('OP')
+            elif self.token.type == 'NEWLINE':
+                self.eat('NEWLINE')
+            elif self.token.type != 'EOF':
+                raise Exception("ParseError: unexpected end of block, ln: {} col: {}, {}".format(self.token.ln, self.token.col, self.token))
+            yield node, first, last
+
     def block(self, end):
         statements = []
         while self.token.type not in end:
@@ -129,16 +230,17 @@ class Parser:
                 statements.append(node)
                 break
             else:
-                raise Exception("ParseError: unexpected end of block, ln: {} col: {}, {}".format(self.lex.ln, self.lex.col, self.token))
+                raise Exception("ParseError: unexpected end of block, ln: {} col: {}, {}".format(self.token.ln, self.token.col, self.token))
         # self.eat('ANY')
         # print("end of block")
         return Block(statements)
 
     def statement(self):
         if self.token.type == 'IDENT':
-            if self.lex.peek_token().value == '=':
+            next_token = self.tokens.peek()
+            if next_token.value == '=':
                 return self.assignment()
-            elif self.lex.peek_token().type == '(':
+            elif next_token.type == '(':
                 return self.fun_call()
             return self.expr()
         elif self.token.type in ['INT', 'FLT', 'STRING', 'BOOL']:
@@ -169,9 +271,37 @@ class Parser:
             formal_params = self.formal_parameters()
         if self.token.type in ['NEWLINE', ';']:
             self.eat('ANY')
+        if self.lazy:
+            node = Defun(token, formal_params, None)
+            node.lazy = LazyBody(self.skim())
+            return node
+        return Defun(token, formal_params, self.function_body())
+
+    def function_body(self):
         block = self.block(end=['END'])
         self.eat('END')
-        return Defun(token, formal_params, block)
+        return block
+
+    def skim(self):
+        """tokens up to the END closing the current def, nested def and if blocks are skipped whole"""
+        tokens = []
+        depth = 1
+        while True:
+            token = self.token
+            if token.type in ('DEF', 'IF'):
+                depth += 1
+            elif token.type == 'END':
+                depth -= 1
+                if depth == 0:
+                    break
+            elif token.type == 'EOF':
+                raise Exception("ParseError: def without end, ln: {} col: {}".format(token.ln, token.col))
+            tokens.append(token)
+            self.token = next(self.tokens)
+        tokens.append(token)
+        tokens.append(Token('EOF', None, token.ln, token.col))
+        self.eat('END')
+        return tokens
 
     def formal_parameters(self):
         self.eat('(')
@@ -250,7 +380,7 @@ class Parser:
             node = UnaryOp(op=token, expr=self.expr())
             return node
         elif token.type == 'IDENT':
-            if self.lex.peek_token().type == '(':
+            if self.tokens.peek().type == '(':
                 return self.fun_call()
             return self.variable()
         else:
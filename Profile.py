@@ -0,0 +1,159 @@
+import json
+import marshal
+from collections import Counter
+from time import perf_counter
+
+
+PROGRAM = '<program>'   # pseudo function the top level calls are attributed to
+
+
+class FunctionStats:
+    def __init__(self, name, line):
+        """timings of one function definition, keyed in Profile by its body"""
+        self.name = name
+        self.line = line
+        self.calls = 0
+        self.primitive_calls = 0    # calls made while no other call of the function was running
+        self.inclusive = 0.0        # seconds, recursive calls counted once
+        self.exclusive = 0.0        # seconds spent in the body itself, callees excluded
+        self.max_depth = 0          # deepest CallStack seen on entry
+        self.callers = {}           # caller FunctionStats -> [calls, seconds]
+        self.active = 0
+
+
+class Profile:
+    def __init__(self, filename='<mylang>'):
+        self.filename = filename
+        self.functions = {}     # Defun block -> FunctionStats
+        self.nodes = Counter()  # node class name -> visits
+        self.program = FunctionStats(PROGRAM, 0)
+        self.total = 0.0
+        self._lines = {}        # Defun block -> line of its 'def'
+        self._stack = []        # [FunctionStats, start, seconds spent in callees]
+
+    def define(self, node):
+        self._lines[node.block] = node.token.token.ln    # the name of a Defun is a Var
+
+    def function(self, proc_symbol):
+        block = proc_symbol.block_ast
+        stats = self.functions.get(block)
+        if stats is None:
+            stats = self.functions[block] = FunctionStats(proc_symbol.name, self._lines.get(block) or 0)
+        return stats
+
+    def enter(self, stats, depth):
+        caller = self._stack[-1][0] if self._stack else self.program
+        edge = stats.callers.get(caller)
+        if edge is None:
+            edge = stats.callers[caller] = [0, 0.0]
+        edge[0] += 1
+        stats.calls += 1
+        if not stats.active:
+            stats.primitive_calls += 1
+        stats.active += 1
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+        self._stack.append([stats, perf_counter(), 0.0])
+
+    def leave(self):
+        stats, start, callees = self._stack.pop()
+        elapsed = perf_counter() - start
+        stats.exclusive += elapsed - callees
+        stats.active -= 1
+        if not stats.active:
+            stats.inclusive += elapsed
+        if self._stack:
+            frame = self._stack[-1]
+            frame[2] += elapsed
+            caller = frame[0]
+        else:
+            caller = self.program
+        stats.callers[caller][1] += elapsed
+
+    def ranked(self):
+        return sorted(self.functions.values(), key=lambda stats: stats.inclusive, reverse=True)
+
+    def report(self):
+        lines = ['profile: {} node visits in {:.6f}s'.format(sum(self.nodes.values()), self.total), '',
+                 '{:>9} {:>9} {:>12} {:>12} {:>6}  {}'.format('calls', 'primitive', 'incl(s)', 'excl(s)',
+                                                          'depth', 'function')]
+        for stats in self.ranked():
+            lines.append('{:>9} {:>9} {:>12.6f} {:>12.6f} {:>6}  {}:{}'.format(
+                stats.calls, stats.primitive_calls, stats.inclusive, stats.exclusive, stats.max_depth,
+                stats.name, stats.line))
+        lines.extend(['', '{:>9}  {}'.format('visits', 'node')])
+        for name, count in self.nodes.most_common():
+            lines.append('{:>9}  {}'.format(count, name))
+        return '\n'.join(lines)
+
+    def _key(self, stats):
+        return self.filename, stats.line, stats.name
+
+    def pstats(self):
+        """{(file, line, name): (primitive calls, calls, exclusive, inclusive, callers)}, as pstats.Stats loads"""
+        table = {}
+        for stats in self.functions.values():
+            callers = {self._key(caller): (calls, calls, seconds, seconds)
+                       for caller, (calls, seconds) in stats.callers.items()}
+            table[self._key(stats)] = (stats.primitive_calls, stats.calls, stats.exclusive, stats.inclusive, callers)
+        return table
+
+    def as_dict(self):
+        return {
+            'file': self.filename,
+            'total': self.total,
+            'functions': [{
+                'name': stats.name,
+                'line': stats.line,
+                'calls': stats.calls,
+                'primitive_calls': stats.primitive_calls,
+                'inclusive': stats.inclusive,
+                'exclusive': stats.exclusive,
+                'max_depth': stats.max_depth,
+                'callers': [{'name': caller.name, 'line': caller.line, 'calls': calls, 'time': seconds}
+                            for caller, (calls, seconds) in stats.callers.items()],
+            } for stats in self.ranked()],
+            'nodes': dict(self.nodes.most_common()),
+        }
+
+    def dump(self, path):
+        """JSON for a .json path, otherwise the marshalled table pstats.Stats(path) reads"""
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump(self.as_dict(), f, indent=2)
+        else:
+            with open(path, 'wb') as f:
+                marshal.dump(self.pstats(), f)
+
+
+class Profiling:
+    """
+    Hooks for an Interpreter subclass: counts every visit and times every function body.
+    Only mixed into ProfilingInterpreter, a plain Interpreter runs without them.
+    """
+    def __init__(self, *args, profile=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profile = Profile() if profile is None else profile
+
+    def interpret(self, tree):
+        start = perf_counter()
+        try:
+            return super().interpret(tree)
+        finally:
+            self.profile.total += perf_counter() - start
+
+    def visit(self, node):
+        self.profile.nodes[type(node).__name__] += 1
+        return super().visit(node)
+
+    def visit_Defun(self, node):
+        self.profile.define(node)
+        return super().visit_Defun(node)
+
+    def run_body(self, proc_symbol, ar):
+        profile = self.profile
+        profile.enter(profile.function(proc_symbol), len(self.call_stack))
+        try:
+            return super().run_body(proc_symbol, ar)
+        finally:
+            profile.leave()
@@ -1,12 +1,32 @@
+import sys
+from contextlib import contextmanager
 from Parser import *
+from Trace import tracer, TraceLevel
+
+
+FALSY = (0, False, None)    # values a condition does not take its branch on, for every engine
 
 
 class NodeVisitor:
+    _dispatch = {}      # node type -> visit method, one table per visitor class
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
+
     def visit(self, node):
-        method_name = 'visit_' + type(node).__name__    # 巧妙
-        visitor = getattr(self, method_name, self.generic_visit)
-        # print(method_name)
-        return visitor(node)
+        visitor = self._dispatch.get(type(node))
+        if visitor is None:
+            visitor = self._resolve(type(node))
+        return visitor(self, node)
+
+    @classmethod
+    def _resolve(cls, node_type):
+        """look 'visit_<NodeClass>' up once per visitor class and node type"""
+        method_name = 'visit_' + node_type.__name__    # 巧妙
+        visitor = getattr(cls, method_name, cls.generic_visit)
+        cls._dispatch[node_type] = visitor
+        return visitor
 
     def generic_visit(self, node):
         raise Exception('No visit_{} method'.format(type(node).__name__))
@@ -18,6 +38,7 @@ class Symbol:
         self.name = name
         self.type = type
         self.scope_level = 0
+        self.slot = None    # index in the activation record of its scope
 
 
 class BuiltinTypeSymbol(Symbol):
@@ -48,6 +69,13 @@ class FunSymbol(Symbol):
         super(FunSymbol, self).__init__(name)
         self.formal_params = [] if formal_params is None else formal_params
         self.block_ast = None
+        self.nslots = 0             # size of the activation record of a call
+        self.access_link = None     # activation record the function was defined in
+        self.pure = False           # see SemanticAnalyzer.classify_pure
+        self.memo = None            # LRUCache of calls already made, when memoizing a pure function
+        self.calls = 0              # calls counted towards the Jit threshold
+        self.jit = None             # compiled body once hot, False if it could not be compiled
+        self.lazy = None            # Defun whose body is parsed on the first call, see Lazy.materialize
 
     def __str__(self):
         return '<{}(name={}, parameters={})>'.format(self.__class__.__name__, self.name, self.formal_params, )
@@ -61,6 +89,8 @@ class ScopedSymbolTable(object):
         self.scope_name = scope_name
         self.scope_level = scope_level
         self.enclosing_scope = enclosing_scope
+        self.size = 0   # number of slots taken by variables and functions
+        self.visible = None     # slots below it are seen through a snapshot(), None for all of them
         self._init_builtins()
 
     def _init_builtins(self):
@@ -88,20 +118,50 @@ class ScopedSymbolTable(object):
     __repr__ = __str__
 
     def insert(self, symbol):
-        print('Insert: %s' % symbol.name)
+        if tracer.level >= TraceLevel.SYMBOLS:
+            tracer.emit('Insert: %s' % symbol.name)
+        if not isinstance(symbol, BuiltinTypeSymbol):
+            previous = self._symbols.get(symbol.name)
+            if previous is not None and previous.slot is not None:
+                symbol.slot = previous.slot     # redefinition reuses the slot
+            else:
+                symbol.slot = self.size
+                self.size += 1
         self._symbols[symbol.name] = symbol
 
-    def lookup(self, name):
-        print('Lookup: %s. (Scope name: %s)' % (name, self.scope_name))
-        # 'symbol' is either an instance of the Symbol class or None
-        symbol = self._symbols.get(name)
-
-        if symbol is not None:
-            return symbol
+    def snapshot(self):
+        """
+        the chain of scopes as it is now, later definitions do not show through it;
+        slots are handed out in definition order and kept by a redefinition, so the size is enough
+        """
+        scope = ScopedSymbolTable.__new__(ScopedSymbolTable)
+        scope._symbols = self._symbols
+        scope.scope_name = self.scope_name
+        scope.scope_level = self.scope_level
+        scope.enclosing_scope = None if self.enclosing_scope is None else self.enclosing_scope.snapshot()
+        scope.size = self.size
+        scope.visible = self.size if self.visible is None else min(self.size, self.visible)
+        return scope
 
-        # recursively go up the chain and lookup the name
-        if self.enclosing_scope is not None:
-            return self.enclosing_scope.lookup(name)
+    def lookup(self, name):
+        return self.resolve(name)[0]
+
+    def resolve(self, name):
+        """(symbol, number of scopes above this one holding it), or (None, None)"""
+        scope = self
+        depth = 0
+        trace = tracer.level >= TraceLevel.SYMBOLS
+        while scope is not None:
+            if trace:
+                tracer.emit('Lookup: %s. (Scope name: %s)' % (name, scope.scope_name))
+            # 'symbol' is either an instance of the Symbol class or None
+            symbol = scope._symbols.get(name)
+            if symbol is not None and (scope.visible is None or symbol.slot is None or symbol.slot < scope.visible):
+                return symbol, depth
+            # go up the chain and lookup the name
+            scope = scope.enclosing_scope
+            depth += 1
+        return None, None
 
 
 class SemanticAnalyzer(NodeVisitor):
@@ -111,21 +171,43 @@ class SemanticAnalyzer(NodeVisitor):
             declaration checking, argument checking, (type checking)
         """
         self.current_scope = None
+        # purity bookkeeping, settled by classify_pure once the whole program is seen
+        self.functions = []     # FunSymbols of the Defuns being visited, innermost last
+        self.defuns = []        # (Defun, FunSymbol) in definition order
+        self.calls = {}         # FunSymbol -> FunSymbols its body calls
+        self.impure = set()     # FunSymbols assigning or reading variables outside their own scope
+        self.redefined = set()  # FunSymbols whose slot may hold another function at run time
+        self.scopes = []        # (name, level, slots) of every scope analyzed, for --stats
 
     def visit_Program(self, node):
-        print('ENTER scope: global')
+        self.enter_global()
+        self.visit(node.block)
+        node.nslots = self.leave_global()
+
+    def enter_global(self):
+        """open the global scope, top level statements can then be visited one by one"""
+        if tracer.level >= TraceLevel.SCOPES:
+            tracer.emit('ENTER scope: global')
         global_scope = ScopedSymbolTable(
             scope_name='global',
             scope_level=1,
             enclosing_scope=self.current_scope,
         )
         self.current_scope = global_scope
+        return global_scope
 
-        self.visit(node.block)
+    def leave_global(self):
+        """close the global scope, return the number of its slots"""
+        global_scope = self.current_scope
+        self.scopes.append((global_scope.scope_name, global_scope.scope_level, global_scope.size))
+        self.classify_pure()
 
-        print(global_scope)
+        if tracer.level >= TraceLevel.SCOPES:
+            tracer.emit(str(global_scope))
         self.current_scope = self.current_scope.enclosing_scope
-        print('LEAVE scope: global')
+        if tracer.level >= TraceLevel.SCOPES:
+            tracer.emit('LEAVE scope: global')
+        return global_scope.size
 
     def visit_Block(self, node):
         for statement in node.statements:
@@ -138,6 +220,9 @@ class SemanticAnalyzer(NodeVisitor):
     def visit_Num(self, node):
         pass
 
+    def visit_Bool(self, node):
+        pass
+
     def visit_String(self, node):
         pass
 
@@ -151,22 +236,47 @@ class SemanticAnalyzer(NodeVisitor):
         self.visit(node.right)
 
         var_name = node.left.value
-        var_symbol = VarSymbol(var_name)
-        if not self.current_scope.lookup(var_name):
+        var_symbol, depth = self.current_scope.resolve(var_name)
+        if not var_symbol:
+            var_symbol = VarSymbol(var_name)
             self.current_scope.insert(var_symbol)
+            depth = 0
+        elif isinstance(var_symbol, FunSymbol):
+            self.redefined.add(var_symbol)
+        if depth and self.functions:
+            self.impure.add(self.functions[-1])
+        node.depth, node.slot = depth, var_symbol.slot
 
     def visit_Var(self, node):  # checking declaration
         var_name = node.value
-        var_symbol = self.current_scope.lookup(var_name)
+        var_symbol, depth = self.current_scope.resolve(var_name)
         if var_symbol is None:
             raise Exception("SemanticError: identifier not found {}".format(node.token))
+        if depth and self.functions and not isinstance(var_symbol, FunSymbol):
+            self.impure.add(self.functions[-1])     # the outer value may change between calls
+        node.depth, node.slot = depth, var_symbol.slot
 
     def visit_Defun(self, node):
         proc_name = node.token.value
         proc_symbol = FunSymbol(proc_name)
+        previous = self.current_scope._symbols.get(proc_name)
+        if previous is not None:
+            self.redefined.update((previous, proc_symbol))
         self.current_scope.insert(proc_symbol)
-
-        print('ENTER scope: %s' % proc_name)
+        node.slot = proc_symbol.slot
+        self.defuns.append((node, proc_symbol))
+        self.calls[proc_symbol] = set()
+        if node.block is None:  # skimmed by a lazy Parser, analyze_body runs on the first call
+            node.lazy.scope = self.current_scope.snapshot()     # names resolve as if analyzed here
+            node.lazy.symbol = proc_symbol
+            self.impure.add(proc_symbol)    # nothing is known about the body yet
+            return
+        self.analyze_body(node, proc_symbol)
+
+    def analyze_body(self, node, proc_symbol):
+        proc_name = proc_symbol.name
+        if tracer.level >= TraceLevel.SCOPES:
+            tracer.emit('ENTER scope: %s' % proc_name)
         # Scope for parameters and local variables
         procedure_scope = ScopedSymbolTable(
             scope_name=proc_name,
@@ -181,26 +291,126 @@ class SemanticAnalyzer(NodeVisitor):
             var_symbol = VarSymbol(param_name)
             self.current_scope.insert(var_symbol)
             proc_symbol.formal_params.append(var_symbol)
+            param.slot = var_symbol.slot
 
+        self.functions.append(proc_symbol)
         self.visit(node.block)
+        self.functions.pop()
+        node.nslots = procedure_scope.size
+        self.scopes.append((procedure_scope.scope_name, procedure_scope.scope_level, procedure_scope.size))
+        self.mark_tail_calls(node.block)
 
-        print(procedure_scope)
+        if tracer.level >= TraceLevel.SCOPES:
+            tracer.emit(str(procedure_scope))
         self.current_scope = self.current_scope.enclosing_scope
-        print('LEAVE scope: %s' % proc_name)
+        if tracer.level >= TraceLevel.SCOPES:
+            tracer.emit('LEAVE scope: %s' % proc_name)
+
+    def classify_pure(self):
+        """
+        A function is pure when its body only touches its own record and every function it
+        calls is pure, so a call with the same arguments can be skipped. Start from every
+        function without outer accesses and drop callers of impure ones until nothing changes,
+        which keeps (mutually) recursive pure functions pure.
+        """
+        pure = {symbol for node, symbol in self.defuns if symbol not in self.impure}
+        changed = True
+        while changed:
+            changed = False
+            for symbol in list(pure):
+                for callee in self.calls[symbol]:
+                    if callee not in pure or callee in self.redefined:
+                        pure.discard(symbol)
+                        changed = True
+                        break
+        for node, symbol in self.defuns:
+            node.pure = symbol.pure = symbol in pure
+
+    def mark_tail_calls(self, block):
+        """flag calls in tail position: the last statement of a function body or of a branch ending it"""
+        statements = block.statements
+        i = len(statements) - 1
+        while i >= 0 and isinstance(statements[i], NoOp):    # trailing empty statements do nothing
+            i -= 1
+        if i < 0:
+            return
+        last = statements[i]
+        if isinstance(last, FunCall):
+            last.tail = True
+        elif isinstance(last, Condition):
+            for pair in last.pair_list:
+                self.mark_tail_calls(pair.block)
+            if last.else_block is not None:
+                self.mark_tail_calls(last.else_block)
 
     def visit_FunCall(self, node):
         for param in node.actual_params:
             self.visit(param)
-        proc_symbol = self.current_scope.lookup(node.token.value)   # 查找函数定义
+        proc_symbol, depth = self.current_scope.resolve(node.token.value)   # 查找函数定义
+        if proc_symbol is None:
+            raise Exception("SemanticError: function not found {}".format(node.token))
         node.proc_symbol = proc_symbol
+        if self.functions:
+            self.calls[self.functions[-1]].add(proc_symbol)
+        node.depth, node.slot = depth, proc_symbol.slot
+
+    def visit_CondPair(self, node):
+        self.visit(node.cond)
+        self.visit(node.block)
+
+    def visit_Condition(self, node):
+        for pair in node.pair_list:
+            self.visit(pair)
+        if node.else_block is not None:
+            self.visit(node.else_block)
+
+
+class StackOverflow(Exception):
+    pass
+
+
+PYTHON_FRAMES_PER_CALL = 40     # Python frames a mylang call may take on an engine recursing in Python
+
+
+@contextmanager
+def python_stack(call_stack):
+    """
+    Raise Python's recursion limit so an engine recursing in Python reaches call_stack.max_depth,
+    a RecursionError raised anyway, by deeply nested expressions for instance, becomes a StackOverflow
+    """
+    limit = sys.getrecursionlimit()
+    if call_stack.max_depth is not None:
+        sys.setrecursionlimit(max(limit, call_stack.max_depth * PYTHON_FRAMES_PER_CALL))
+    try:
+        yield
+    except RecursionError as e:
+        raise StackOverflow('RuntimeError: stack overflow, Python recursion limit reached at call depth {}'.format(
+            len(call_stack))) from e
+    finally:
+        sys.setrecursionlimit(limit)
 
 
 class CallStack:
-    def __init__(self):
+    def __init__(self, max_depth=None):
+        """max_depth: most activation records allowed at once, unlimited if None"""
         self._records = []
+        self.max_depth = max_depth
+        self.peak = 0   # most records held at once
 
     def push(self, ar):
+        if self.max_depth is not None and len(self._records) >= self.max_depth:
+            raise StackOverflow('RuntimeError: stack overflow, call depth exceeds {} in {}'.format(
+                self.max_depth, ar.name))
         self._records.append(ar)
+        if len(self._records) > self.peak:
+            self.peak = len(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def replace(self, ar):
+        """swap the top record for 'ar', a tail call runs without growing the stack"""
+        self._records[-1] = ar
 
     def pop(self):
         return self._records.pop()
@@ -223,11 +433,27 @@ class ARType:
 
 
 class ActivationRecord:
-    def __init__(self, name, type, nesting_level):
+    __slots__ = ('name', 'type', 'nesting_level', 'members', 'slots', 'enclosing')
+
+    def __init__(self, name, type, nesting_level, nslots=None, enclosing=None):
+        """
+        nslots: use a preallocated slot list indexed by the analyzer's slot numbers
+                instead of the name keyed members dict
+        enclosing: access link, the record of the lexically enclosing scope
+        """
         self.name = name
         self.type = type
         self.nesting_level = nesting_level
-        self.members = {}
+        self.members = {} if nslots is None else None
+        self.slots = None if nslots is None else [None] * nslots
+        self.enclosing = enclosing
+
+    def outer(self, depth):
+        ar = self
+        while depth:
+            ar = ar.enclosing
+            depth -= 1
+        return ar
 
     def __setitem__(self, key, value):
         self.members[key] = value
@@ -242,12 +468,16 @@ class ActivationRecord:
         lines = [
             '{level}: {type} {name}'.format(
                 level=self.nesting_level,
-                type=self.type.value,
+                type=self.type,
                 name=self.name,
             )
         ]
-        for name, val in self.members.items():
-            lines.append(f'   {name:<20}: {val}')
+        if self.slots is not None:
+            for slot, val in enumerate(self.slots):
+                lines.append(f'   {slot:<20}: {val}')
+        else:
+            for name, val in self.members.items():
+                lines.append(f'   {name:<20}: {val}')
 
         s = '\n'.join(lines)
         return s
@@ -0,0 +1,60 @@
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+from Client import read_message, write_message
+
+
+def start_worker(initializer, initargs):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # Ctrl-C stops the server, which then stops the pool
+    if initializer is not None:
+        initializer(*initargs)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            request = read_message(self.rfile)
+            if request is None:
+                return
+            try:
+                response = self.server.pool.apply(self.server.job, (request,))
+            except Exception as e:     # the request could not be handed to a worker or back
+                response = {'output': '', 'error': 'ServerError: {}'.format(e), 'seconds': 0.0}
+            write_message(self.wfile, response)
+
+
+class ProgramServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, job, workers=None, initializer=None, initargs=()):
+        """
+        Answers every JSON request read from the Unix socket 'path' with job(request), run in a pool
+        of worker processes started once, so requests find the modules imported and caches warm.
+        A thread per connection waits on the pool, connections are served concurrently.
+        workers: pool size, os.cpu_count() if None
+        """
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.remove(path)     # left behind by a server that was killed
+            else:
+                raise Exception("ServerError: a server is already listening on {}".format(path))
+            finally:
+                probe.close()
+        super().__init__(path, RequestHandler)
+        self.path = path
+        self.job = job
+        self.pool = multiprocessing.Pool(workers, start_worker, (initializer, initargs))
+
+    def server_close(self):
+        super().server_close()
+        self.pool.terminate()
+        self.pool.join()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
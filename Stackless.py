@@ -0,0 +1,290 @@
+from collections import deque
+from Semantic import *
+from Output import OutputChannel
+from Memo import memo_key
+from Lazy import materialize
+
+
+DEFERRED = object()     # returned by a leaf_* method for a node that needs a generator after all
+OPERANDS = (Num, Bool, String, Var, NoOp)
+
+
+def inline(node):
+    """
+    whether the expression 'node' makes no call, it then cannot recurse and is evaluated on the spot;
+    worked out once per BinOp and UnaryOp and kept in their 'inline' slot
+    """
+    node_type = type(node)
+    if node_type is BinOp:
+        result = node.inline
+        if result is None:
+            result = node.inline = inline(node.left) and inline(node.right)
+        return result
+    if node_type is UnaryOp:
+        result = node.inline
+        if result is None:
+            result = node.inline = inline(node.expr)
+        return result
+    return node_type in OPERANDS
+
+
+class StacklessInterpreter(NodeVisitor):
+    def __init__(self, out=None, max_depth=None, tco=True, memo=None):
+        """
+        Tree walking interpreter that never recurses in Python:
+            every visit_* method is a generator that yields the child nodes it needs and
+            receives their values back, and run() drives the generators from an explicit
+            continuation stack, so mylang recursion is bounded by max_depth, not by Python
+        Expressions without calls, and assignments of them, are evaluated on the spot and
+        blocks are delegated to with yield from, but every call and condition still costs a
+        generator: this engine trades speed for depth, it runs slower than the tree engine.
+        """
+        self.call_stack = CallStack(max_depth)
+        self.out = OutputChannel() if out is None else out
+        self.tco = tco
+        self.memo = memo
+        self.tail_call = None   # (function, record, cache, key) left by a call in tail position for its caller to run
+        self.steps = 0          # trampoline iterations of run_sliced
+        # nodes evaluated on the spot, without a generator of their own, unless DEFERRED
+        self.leaves = {
+            Num: self.leaf_Constant,
+            Bool: self.leaf_Constant,
+            String: self.leaf_Constant,
+            Var: self.leaf_Var,
+            NoOp: self.leaf_NoOp,
+            Defun: self.leaf_Defun,
+            BinOp: self.leaf_Expression,
+            UnaryOp: self.leaf_Expression,
+            Assign: self.leaf_Assign,
+        }
+
+    def interpret(self, tree):
+        try:
+            return self.run(tree)
+        finally:
+            self.out.flush()
+
+    def run(self, node):
+        leaves = self.leaves
+        visit = self.visit
+        stack = []      # continuations: generators waiting for the value of a child
+        frame = visit(node)
+        value = None
+        while True:
+            try:
+                child = frame.send(value)
+            except StopIteration as stop:
+                if not stack:
+                    return stop.value
+                value = stop.value
+                frame = stack.pop()
+                continue
+            leaf = leaves.get(type(child))
+            if leaf is not None:
+                value = leaf(child)
+                if value is not DEFERRED:
+                    continue
+            stack.append(frame)
+            frame = visit(child)
+            value = None
+
+    def run_sliced(self, node, size):
+        """
+        run() as a generator yielding after every slice of 'size' steps, a step being one child
+        handed out or one value handed back; the size of the next slice may be sent in, the value
+        of 'node' is returned through StopIteration
+        """
+        leaves = self.leaves
+        visit = self.visit
+        stack = []
+        frame = visit(node)
+        value = None
+        left = size
+        try:
+            while True:
+                if not left:
+                    self.steps += size
+                    size = (yield) or size
+                    left = size
+                left -= 1
+                try:
+                    child = frame.send(value)
+                except StopIteration as stop:
+                    if not stack:
+                        return stop.value
+                    value = stop.value
+                    frame = stack.pop()
+                    continue
+                leaf = leaves.get(type(child))
+                if leaf is not None:
+                    value = leaf(child)
+                    if value is not DEFERRED:
+                        continue
+                stack.append(frame)
+                frame = visit(child)
+                value = None
+        finally:
+            self.steps += size - left   # the steps of the last, unfinished slice
+
+    def leaf_Constant(self, node):
+        return node.token.value     # as Interpreter.visit_Num
+
+    def leaf_NoOp(self, node):     # dummy node
+        return "No operation."
+
+    def leaf_Var(self, node):
+        ar = self.call_stack.peek()
+        depth = node.depth
+        while depth:
+            ar = ar.enclosing
+            depth -= 1
+        var_value = ar.slots[node.slot]
+        if var_value is None:   # right now, 'None' is not assignable
+            raise Exception("Undefined identifier: " + node.value)
+        return var_value
+
+    def leaf_Expression(self, node):
+        if not inline(node):
+            return DEFERRED
+        return self.evaluate(node)
+
+    def leaf_Assign(self, node):
+        if not inline(node.right):
+            return DEFERRED
+        return self.assign(node, self.evaluate(node.right))
+
+    def evaluate(self, node):
+        """value of an inline() expression, recursing in Python only as deep as the expression"""
+        node_type = type(node)
+        if node_type is BinOp:
+            return self.binary(node.op.value, self.evaluate(node.left), self.evaluate(node.right))
+        if node_type is UnaryOp:
+            return self.unary(node.op.value, self.evaluate(node.expr))
+        return self.leaves[node_type](node)
+
+    def binary(self, op, left, right):
+        if op == '+':
+            return left + right
+        elif op == '-':
+            return left - right
+        elif op == '*':
+            return left * right
+        elif op == '/':
+            return left / right
+        elif op == '//':
+            return left // right
+
+    def unary(self, op, value):
+        if op == '+':
+            return +value
+        if op == '-':
+            return -value
+
+    def assign(self, node, var_value):
+        ar = self.call_stack.peek()
+        depth = node.depth
+        while depth:
+            ar = ar.enclosing
+            depth -= 1
+        ar.slots[node.slot] = var_value
+        return "Assign {} with {}".format(node.left.value, var_value)
+
+    def leaf_Defun(self, node):
+        proc_name = node.token.value
+        proc_symbol = FunSymbol(proc_name)
+        proc_symbol.formal_params = node.formal_params
+        proc_symbol.block_ast = node.block
+        proc_symbol.nslots = node.nslots
+        if node.block is None:
+            proc_symbol.lazy = node
+        if node.pure and self.memo is not None:
+            proc_symbol.memo = self.memo.cache(proc_name)
+        current_ar = self.call_stack.peek()
+        proc_symbol.access_link = current_ar
+        current_ar.slots[node.slot] = proc_symbol
+        return "define {}".format(proc_name)
+
+    def visit_Program(self, node):
+        ar = ActivationRecord(
+            name="mylang",
+            type=ARType.PROGRAM,
+            nesting_level=1,
+            nslots=node.nslots,
+        )
+        self.call_stack.push(ar)
+        write = self.out.write
+        for statement in node.block.statements:     # top level results are the program output
+            write((yield statement))
+        self.call_stack.pop()
+
+    def visit_Block(self, node):
+        for statement in node.statements:
+            result = yield statement
+            if tracer.level >= TraceLevel.ALL:
+                tracer.emit(str(result))
+
+    def visit_BinOp(self, node):
+        left = yield node.left
+        right = yield node.right
+        return self.binary(node.op.value, left, right)
+
+    def visit_UnaryOp(self, node):
+        return self.unary(node.op.value, (yield node.expr))
+
+    def visit_Assign(self, node):
+        return self.assign(node, (yield node.right))
+
+    def visit_FunCall(self, node):
+        proc_name = node.token.value
+        proc_symbol = self.call_stack.peek().outer(node.depth).slots[node.slot]
+        if proc_symbol.lazy is not None:    # first call of a function skimmed by --lazy
+            materialize(proc_symbol)
+
+        ar = ActivationRecord(
+            name=proc_name,
+            type=ARType.PROCEDURE,
+            nesting_level=proc_symbol.scope_level + 1,
+            nslots=proc_symbol.nslots,
+            enclosing=proc_symbol.access_link,
+        )
+        for param, argument_node in zip(proc_symbol.formal_params, node.actual_params):
+            ar.slots[param.slot] = yield argument_node
+        memo = proc_symbol.memo
+        key = None
+        if memo is not None:
+            if tracer.level >= TraceLevel.ALL:     # a skipped body would trace nothing
+                memo = None
+            else:
+                key = memo_key([ar.slots[param.slot] for param in proc_symbol.formal_params])
+                if key in memo:
+                    return "Call {}, params {}".format(proc_name, node.actual_params)
+        if node.tail and self.tco:
+            self.tail_call = (proc_symbol, ar, memo, key)
+            return "Call {}, params {}".format(proc_name, node.actual_params)
+        self.call_stack.push(ar)
+        # blocks are delegated to rather than handed to run(), they never nest deeper than the source does
+        result = yield from self.visit_Block(proc_symbol.block_ast)
+        pending = None      # (cache, key) of the pure calls run in place, they all end with this result
+        while self.tail_call is not None:
+            proc_symbol, ar, tail_memo, tail_key = self.tail_call
+            self.tail_call = None
+            if tail_memo is not None:
+                if pending is None:
+                    pending = deque(maxlen=self.memo.capacity)
+                pending.append((tail_memo, tail_key))
+            self.call_stack.replace(ar)
+            result = yield from self.visit_Block(proc_symbol.block_ast)
+        self.call_stack.pop()
+        if pending is not None:
+            for tail_memo, tail_key in pending:
+                tail_memo.put(tail_key, result)
+        if memo is not None:
+            memo.put(key, result)
+        return "Call {}, params {}".format(proc_name, node.actual_params)
+
+    def visit_Condition(self, node):
+        for pair in node.pair_list:
+            if (yield pair.cond) not in FALSY:
+                return (yield from self.visit_Block(pair.block))
+        if node.else_block is not None:
+            return (yield from self.visit_Block(node.else_block))
@@ -0,0 +1,97 @@
+import json
+import sys
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+from Parser import AST
+
+
+def fields(node):
+    """values of the attributes a node declares in __slots__"""
+    for cls in type(node).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            yield getattr(node, name, None)
+
+
+def count_nodes(tree):
+    """AST nodes reachable from 'tree', by class name"""
+    counts = Counter()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        counts[type(node).__name__] += 1
+        for value in fields(node):
+            if isinstance(value, AST):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend(item for item in value if isinstance(item, AST))
+    return counts
+
+
+class PipelineStats:
+    def __init__(self, trace_memory=True):
+        """
+        Measurements of one parse_file run for --stats.
+        trace_memory: record allocation peaks of each phase with tracemalloc, which slows every phase down
+        """
+        self.trace_memory = trace_memory
+        self.phases = []        # {'name', 'seconds', 'allocated', 'peak'} in run order
+        self.tokens = None      # None when the front end was skipped by a cache hit
+        self.nodes = None
+        self.optimized_nodes = None
+        self.scopes = None      # (name, level, slots) of every scope the analyzer closed
+        self.peak_depth = None
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            record = {'name': name, 'seconds': perf_counter() - start}
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record['allocated'] = current - before     # still alive when the phase ended
+                record['peak'] = peak - before              # high water mark above the starting point
+            self.phases.append(record)
+
+    def as_dict(self):
+        scopes = None
+        if self.scopes is not None:
+            scopes = {
+                'count': len(self.scopes),
+                'slots': sum(slots for name, level, slots in self.scopes),
+                'max_slots': max((slots for name, level, slots in self.scopes), default=0),
+                'max_level': max((level for name, level, slots in self.scopes), default=0),
+            }
+        return {
+            'phases': self.phases,
+            'total_seconds': sum(phase['seconds'] for phase in self.phases),
+            'tokens': self.tokens,
+            'nodes': None if self.nodes is None else dict(self.nodes.most_common()),
+            'optimized_nodes': None if self.optimized_nodes is None else dict(self.optimized_nodes.most_common()),
+            'scopes': scopes,
+            'peak_call_depth': self.peak_depth,
+        }
+
+    def write(self, path='-'):
+        """JSON to 'path', or stderr for '-'"""
+        text = json.dumps(self.as_dict(), indent=2)
+        if path == '-':
+            print(text, file=sys.stderr)
+        else:
+            with open(path, 'w') as f:
+                f.write(text)
+                f.write('\n')
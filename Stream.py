@@ -0,0 +1,30 @@
+from Lexer import StreamLexer
+from Semantic import *
+from Optimizer import ConstantFolder
+
+
+def stream_program(file, call_stack, optimize=True, lazy=False, chunk_size=1 << 16):
+    """
+    Program whose top level statements are lexed, parsed, analyzed and optimized one at a time,
+    as the Interpreter running it asks for the next one. Once run, a statement is only kept if
+    something refers to it, the body of a function for instance.
+    call_stack: CallStack of that Interpreter, its global record grows with the global scope
+    """
+    return Program(Block(statements(file, call_stack, optimize, lazy, chunk_size)))
+
+
+def statements(file, call_stack, optimize, lazy, chunk_size):
+    parser = Parser('', tokens=StreamLexer(file, chunk_size).tokens(), lazy=lazy)
+    analyzer = SemanticAnalyzer()
+    global_scope = analyzer.enter_global()
+    folder = ConstantFolder() if optimize else None
+    for node, first, last in parser.statements():
+        analyzer.visit(node)
+        if folder is not None:
+            node = folder.visit(node)
+        slots = call_stack.peek().slots
+        if len(slots) < global_scope.size:  # new global variables and functions
+            slots.extend([None] * (global_scope.size - len(slots)))
+        yield node
+    parser.eat('EOF')
+    analyzer.leave_global()
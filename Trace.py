@@ -0,0 +1,72 @@
+import sys
+from collections import deque
+
+
+class TraceLevel:
+    OFF = 0
+    SCOPES = 1      # scope entry/exit and symbol table dumps
+    SYMBOLS = 2     # every symbol insert and lookup
+    ALL = 3         # results of statements inside function bodies and branches
+
+
+LEVELS = {'off': TraceLevel.OFF, 'scopes': TraceLevel.SCOPES, 'symbols': TraceLevel.SYMBOLS, 'all': TraceLevel.ALL}
+
+
+class StdoutSink:
+    def write(self, message):
+        print(message)
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def write(self, message):
+        self.file.write(message)
+        self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+
+class RingBufferSink:
+    def __init__(self, capacity=1000):
+        """keep only the last 'capacity' messages in memory"""
+        self.lines = deque(maxlen=capacity)
+
+    def write(self, message):
+        self.lines.append(message)
+
+    def dump(self, stream=None):
+        stream = sys.stderr if stream is None else stream
+        for line in self.lines:
+            stream.write(line)
+            stream.write('\n')
+
+    def close(self):
+        pass
+
+
+class Tracer:
+    def __init__(self, level=TraceLevel.OFF, sink=None):
+        """
+        Callers test 'tracer.level' before building a message,
+        so with tracing off no diagnostic is ever formatted.
+        """
+        self.level = level
+        self.sink = StdoutSink() if sink is None else sink
+
+    def configure(self, level, sink=None):
+        self.sink.close()
+        self.level = level
+        self.sink = StdoutSink() if sink is None else sink
+
+    def emit(self, message):
+        self.sink.write(message)
+
+
+# shared by SemanticAnalyzer and the execution engines, configured from mylang.py
+tracer = Tracer()
@@ -0,0 +1,340 @@
+from array import array
+from Semantic import *
+from Output import OutputChannel
+
+
+# opcodes, every opcode is followed by one integer argument
+LOAD_CONST = 0          # push consts[arg]
+LOAD_LOCAL = 1          # push slot arg of the current activation record
+STORE_LOCAL = 2         # pop a value into slot arg, push the assignment message
+LOAD_OUTER = 16         # push the slot at the (depth, slot, name) address consts[arg]
+STORE_OUTER = 17        # pop a value into the (depth, slot, name) address consts[arg]
+BINARY_ADD = 3
+BINARY_SUB = 4
+BINARY_MUL = 5
+BINARY_DIV = 6
+BINARY_FLOORDIV = 7
+UNARY_POS = 8
+UNARY_NEG = 9
+PRINT = 10              # pop the result of a top level statement into the output channel
+JUMP = 11               # jump to arg
+POP_JUMP_IF_FALSE = 12  # pop a condition, jump to arg if it is 0, False or None
+MAKE_FUNCTION = 13      # bind the Function consts[arg] to the current record, push the define message
+CALL_FUNCTION = 14      # call with the (depth, slot, argc, message) descriptor consts[arg]
+RETURN = 15             # leave the current code object
+TRACE = 18              # pop the result of a nested statement, emit it when tracing everything
+TAIL_CALL = 19          # like CALL_FUNCTION, but the callee replaces the current record once it returns
+
+OPNAMES = [
+    'LOAD_CONST', 'LOAD_LOCAL', 'STORE_LOCAL', 'BINARY_ADD', 'BINARY_SUB', 'BINARY_MUL', 'BINARY_DIV',
+    'BINARY_FLOORDIV', 'UNARY_POS', 'UNARY_NEG', 'PRINT', 'JUMP', 'POP_JUMP_IF_FALSE', 'MAKE_FUNCTION',
+    'CALL_FUNCTION', 'RETURN', 'LOAD_OUTER', 'STORE_OUTER', 'TRACE', 'TAIL_CALL',
+]
+
+BINARY_OPS = {'+': BINARY_ADD, '-': BINARY_SUB, '*': BINARY_MUL, '/': BINARY_DIV, '//': BINARY_FLOORDIV}
+UNARY_OPS = {'+': UNARY_POS, '-': UNARY_NEG}
+
+
+class Code:
+    def __init__(self, name, nslots):
+        """compiled body of the program or of a function"""
+        self.name = name
+        self.ops = array('l')               # opcode, argument, opcode, argument, ...
+        self.consts = []                    # constant pool
+        self.varnames = [None] * nslots     # name table, indexed by slot
+        self._const_index = {}
+
+    def emit(self, op, arg=0):
+        self.ops.append(op)
+        self.ops.append(arg)
+        return len(self.ops) - 1    # position of the argument, for patching jumps
+
+    def patch(self, pos, target):
+        self.ops[pos] = target
+
+    def add_const(self, value):
+        key = (type(value), value)     # 1 == 1.0 == True, so tell them apart by type
+        if key not in self._const_index:
+            self._const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return self._const_index[key]
+
+    def add_name(self, slot, name):
+        self.varnames[slot] = name
+        return slot
+
+    def dis(self):
+        lines = ['code {}'.format(self.name)]
+        nested = []
+        for pc in range(0, len(self.ops), 2):
+            op, arg = self.ops[pc], self.ops[pc + 1]
+            if op in (LOAD_LOCAL, STORE_LOCAL):
+                detail = self.varnames[arg]
+            elif op in (LOAD_CONST, LOAD_OUTER, STORE_OUTER, MAKE_FUNCTION, CALL_FUNCTION, TAIL_CALL):
+                detail = repr(self.consts[arg])
+                if op == MAKE_FUNCTION:
+                    nested.append(self.consts[arg].code)
+            else:
+                detail = ''
+            lines.append('{:>6} {:<18} {:>4} {}'.format(pc, OPNAMES[op], arg, detail))
+        for code in nested:
+            lines.append('')
+            lines.append(code.dis())
+        return '\n'.join(lines)
+
+
+class Function:
+    def __init__(self, name, params, code, nesting_level, slot):
+        """stored in the defining record as (function, defining record) by MAKE_FUNCTION"""
+        self.name = name
+        self.params = params    # parameter slots
+        self.code = code
+        self.nesting_level = nesting_level
+        self.slot = slot        # slot of the function in the defining record
+        self.nslots = len(code.varnames)
+
+    def __repr__(self):
+        return '<Function(name={}, parameters={})>'.format(self.name, self.code.varnames[:len(self.params)])
+
+
+class Compiler(NodeVisitor):
+    def __init__(self, tco=True):
+        """lower an analyzed Program into Code objects, tco: compile calls in tail position to TAIL_CALL"""
+        self.code = None
+        self.nesting_level = 1
+        self.tco = tco
+
+    def compile(self, tree):
+        return self.visit(tree)
+
+    def visit_Program(self, node):
+        self.code = Code('mylang', node.nslots)
+        for statement in node.block.statements:     # top level results are the program output
+            self.visit(statement)
+            self.code.emit(PRINT)
+        self.code.emit(RETURN)
+        return self.code
+
+    def visit_Block(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+            self.code.emit(TRACE)
+
+    def visit_NoOp(self, node):
+        self.code.emit(LOAD_CONST, self.code.add_const("No operation."))
+
+    def visit_Num(self, node):
+        self.code.emit(LOAD_CONST, self.code.add_const(node.value))
+
+    visit_Bool = visit_String = visit_Num
+
+    def visit_BinOp(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+        op = BINARY_OPS.get(node.op.value)
+        if op is None:
+            raise Exception('CompileError: unsupported operator {}'.format(node.op))
+        self.code.emit(op)
+
+    def visit_UnaryOp(self, node):
+        self.visit(node.expr)
+        self.code.emit(UNARY_OPS[node.op.value])
+
+    def visit_Var(self, node):
+        if node.depth == 0:
+            self.code.emit(LOAD_LOCAL, self.code.add_name(node.slot, node.value))
+        else:
+            self.code.emit(LOAD_OUTER, self.code.add_const((node.depth, node.slot, node.value)))
+
+    def visit_Assign(self, node):
+        self.visit(node.right)
+        if node.depth == 0:
+            self.code.emit(STORE_LOCAL, self.code.add_name(node.slot, node.left.value))
+        else:
+            self.code.emit(STORE_OUTER, self.code.add_const((node.depth, node.slot, node.left.value)))
+
+    def visit_Defun(self, node):
+        proc_name = node.token.value
+        outer, self.code = self.code, Code(proc_name, node.nslots)
+        for param in node.formal_params:
+            self.code.add_name(param.slot, param.token.value)
+        self.nesting_level += 1
+        self.visit(node.block)
+        self.code.emit(RETURN)
+        self.nesting_level -= 1
+        function = Function(proc_name, [param.slot for param in node.formal_params], self.code,
+                            self.nesting_level + 1, node.slot)
+        self.code = outer
+        self.code.add_name(node.slot, proc_name)
+        self.code.emit(MAKE_FUNCTION, self.code.add_const(function))
+
+    def visit_FunCall(self, node):
+        for argument in node.actual_params:
+            self.visit(argument)
+        message = "Call {}, params {}".format(node.token.value, node.actual_params)
+        call = (node.depth, node.slot, len(node.actual_params), message)
+        op = TAIL_CALL if node.tail and self.tco else CALL_FUNCTION
+        self.code.emit(op, self.code.add_const(call))
+
+    def visit_Condition(self, node):
+        exits = []
+        for pair in node.pair_list:
+            self.visit(pair.cond)
+            skip = self.code.emit(POP_JUMP_IF_FALSE)
+            self.visit(pair.block)
+            exits.append(self.code.emit(JUMP))
+            self.code.patch(skip, len(self.code.ops))
+        if node.else_block is not None:
+            self.visit(node.else_block)
+        for pos in exits:
+            self.code.patch(pos, len(self.code.ops))
+        self.code.emit(LOAD_CONST, self.code.add_const(None))
+
+
+class VM:
+    def __init__(self, out=None, max_depth=None):
+        """stack based virtual machine running Code produced by Compiler"""
+        self.call_stack = CallStack(max_depth)
+        self.out = OutputChannel() if out is None else out
+
+    def run(self, code):
+        try:
+            self.execute(code)
+        finally:
+            self.out.flush()
+
+    def execute(self, code):
+        call_stack = self.call_stack
+        write = self.out.write
+        ar = ActivationRecord(
+            name="mylang",
+            type=ARType.PROGRAM,
+            nesting_level=1,
+            nslots=len(code.varnames),
+        )
+        call_stack.push(ar)
+        frames = []     # suspended callers: (code, pc, stack, message)
+        tail_call = None    # (function, record) set by TAIL_CALL, entered when the current body returns
+        ops, consts = code.ops, code.consts
+        slots = ar.slots
+        stack = []
+        pc = 0
+        while True:
+            op = ops[pc]
+            arg = ops[pc + 1]
+            pc += 2
+            if op == LOAD_LOCAL:
+                var_value = slots[arg]
+                if var_value is None:   # right now, 'None' is not assignable
+                    raise Exception("Undefined identifier: " + code.varnames[arg])
+                stack.append(var_value)
+            elif op == LOAD_CONST:
+                stack.append(consts[arg])
+            elif op == TRACE:
+                result = stack.pop()
+                if tracer.level >= TraceLevel.ALL:
+                    tracer.emit(str(result))
+            elif op == PRINT:
+                write(stack.pop())
+            elif op == BINARY_ADD:
+                right = stack.pop()
+                stack[-1] = stack[-1] + right
+            elif op == BINARY_SUB:
+                right = stack.pop()
+                stack[-1] = stack[-1] - right
+            elif op == BINARY_MUL:
+                right = stack.pop()
+                stack[-1] = stack[-1] * right
+            elif op == BINARY_DIV:
+                right = stack.pop()
+                stack[-1] = stack[-1] / right
+            elif op == BINARY_FLOORDIV:
+                right = stack.pop()
+                stack[-1] = stack[-1] // right
+            elif op == POP_JUMP_IF_FALSE:
+                if stack.pop() in FALSY:
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == STORE_LOCAL:
+                var_value = stack.pop()
+                slots[arg] = var_value
+                stack.append("Assign {} with {}".format(code.varnames[arg], var_value))
+            elif op == CALL_FUNCTION:
+                depth, slot, argc, message = consts[arg]
+                function, access_link = ar.outer(depth).slots[slot]
+                arguments = stack[len(stack) - argc:]
+                del stack[len(stack) - argc:]
+                ar = ActivationRecord(
+                    name=function.name,
+                    type=ARType.PROCEDURE,
+                    nesting_level=function.nesting_level,
+                    nslots=function.nslots,
+                    enclosing=access_link,
+                )
+                slots = ar.slots
+                for param_slot, argument in zip(function.params, arguments):
+                    slots[param_slot] = argument
+                call_stack.push(ar)
+                frames.append((code, pc, stack, message))
+                code = function.code
+                ops, consts = code.ops, code.consts
+                stack = []
+                pc = 0
+            elif op == TAIL_CALL:
+                depth, slot, argc, message = consts[arg]
+                function, access_link = ar.outer(depth).slots[slot]
+                arguments = stack[len(stack) - argc:]
+                del stack[len(stack) - argc:]
+                callee = ActivationRecord(
+                    name=function.name,
+                    type=ARType.PROCEDURE,
+                    nesting_level=function.nesting_level,
+                    nslots=function.nslots,
+                    enclosing=access_link,
+                )
+                for param_slot, argument in zip(function.params, arguments):
+                    callee.slots[param_slot] = argument
+                tail_call = (function, callee)
+                stack.append(message)
+            elif op == RETURN:
+                if tail_call is not None:
+                    # the caller's frame stays suspended, the callee runs in place of this body
+                    function, ar = tail_call
+                    tail_call = None
+                    call_stack.replace(ar)
+                    slots = ar.slots
+                    code = function.code
+                    ops, consts = code.ops, code.consts
+                    stack = []
+                    pc = 0
+                    continue
+                call_stack.pop()
+                if not frames:
+                    return
+                code, pc, stack, message = frames.pop()
+                ops, consts = code.ops, code.consts
+                ar = call_stack.peek()
+                slots = ar.slots
+                stack.append(message)
+            elif op == LOAD_OUTER:
+                depth, slot, var_name = consts[arg]
+                var_value = ar.outer(depth).slots[slot]
+                if var_value is None:
+                    raise Exception("Undefined identifier: " + var_name)
+                stack.append(var_value)
+            elif op == STORE_OUTER:
+                depth, slot, var_name = consts[arg]
+                var_value = stack.pop()
+                ar.outer(depth).slots[slot] = var_value
+                stack.append("Assign {} with {}".format(var_name, var_value))
+            elif op == MAKE_FUNCTION:
+                function = consts[arg]
+                slots[function.slot] = (function, ar)
+                stack.append("define {}".format(function.name))
+            elif op == UNARY_NEG:
+                stack[-1] = -stack[-1]
+            elif op == UNARY_POS:
+                stack[-1] = +stack[-1]
+            else:
+                raise Exception('VMError: bad opcode {} at {}'.format(op, pc - 2))
@@ -0,0 +1,89 @@
+"""
+Per-node memory of the __slots__ AST classes and Token against the same classes
+with a per-instance __dict__, as they were before, and the totals for a generated program.
+
+    python bench/ast_memory.py [--statements N] [--instances N]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Lexer import Token
+from Semantic import *
+from Stats import count_nodes
+from generate import generate
+
+
+def slot_names(cls):
+    return [name for klass in reversed(cls.__mro__) for name in klass.__dict__.get('__slots__', ())]
+
+
+def dict_class(cls):
+    """a class with the attributes of 'cls' kept in an instance __dict__"""
+    names = slot_names(cls)
+
+    def __init__(self, *values):
+        for name, value in zip(names, values):
+            setattr(self, name, value)
+    return type('Dict' + cls.__name__, (), {'__init__': __init__})
+
+
+def slot_instance(cls, *values):
+    node = cls.__new__(cls)
+    for name, value in zip(slot_names(cls), values):
+        setattr(node, name, value)
+    return node
+
+
+def bytes_per_instance(make, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [make() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    list_bytes = sys.getsizeof(instances)
+    del instances
+    return (after - before - list_bytes) / count
+
+
+def node_classes():
+    return [Token] + sorted(AST.__subclasses__(), key=lambda cls: cls.__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AST and Token memory footprint")
+    parser.add_argument("--statements", type=int, default=4000, help="size of the generated program")
+    parser.add_argument("--instances", type=int, default=20000, help="instances allocated per class")
+    args = parser.parse_args()
+
+    shared = object()   # every attribute points at the same object, only the instances are measured
+    sizes = {}
+    for cls in node_classes():
+        values = [shared] * len(slot_names(cls))
+        legacy = dict_class(cls)
+        sizes[cls.__name__] = (bytes_per_instance(lambda: slot_instance(cls, *values), args.instances),
+                               bytes_per_instance(lambda: legacy(*values), args.instances))
+
+    text = generate(statements=args.statements)
+    tokens = list(RegexLexer(text).tokens())
+    tree = Parser(text, tokens=tokens).parse()
+    SemanticAnalyzer().visit(tree)
+    counts = count_nodes(tree)
+    counts['Token'] = len(tokens)
+
+    print('{:<10} {:>9} {:>12} {:>12}'.format('class', 'count', 'slots(B)', 'dict(B)'))
+    total_slots = total_dict = 0
+    for name, (slotted, legacy) in sizes.items():
+        count = counts.get(name, 0)
+        total_slots += count * slotted
+        total_dict += count * legacy
+        print('{:<10} {:>9} {:>12.1f} {:>12.1f}'.format(name, count, slotted, legacy))
+    print('{} lines: {:.2f} MB with __slots__, {:.2f} MB with __dict__ ({:.0%} saved)'.format(
+        text.count('\n'), total_slots / 2 ** 20, total_dict / 2 ** 20, 1 - total_slots / total_dict))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Many generated programs interleaved on one event loop with Async.run_program, against running
+them one after the other, and how evenly the loop shared the steps between them.
+
+    python bench/async_programs.py [--programs N] [--statements N] [--budget STEPS]
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Semantic import *
+from Async import ProgramTask
+from Output import OutputChannel
+from Stackless import StacklessInterpreter
+from generate import generate
+
+
+def analyzed(text):
+    tree = Parser(text).parse()
+    SemanticAnalyzer().visit(tree)
+    return tree
+
+
+async def interleaved(trees, budget, sample):
+    """seconds, tasks and, when sampling, the steps of every program at each turn of the loop"""
+    tasks = [ProgramTask(tree, budget, OutputChannel.memory()) for tree in trees]
+    progress = []
+
+    async def sampler():
+        while not all(task.done for task in tasks):
+            progress.append([task.steps for task in tasks])
+            await asyncio.sleep(0)
+
+    coroutines = [task.run() for task in tasks]
+    if sample:
+        coroutines.append(sampler())
+    start = perf_counter()
+    await asyncio.gather(*coroutines)
+    return perf_counter() - start, tasks, progress
+
+
+def without_addresses(text):
+    return re.sub('0x[0-9a-f]+', '', text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="interleave mylang programs under asyncio")
+    parser.add_argument("--programs", type=int, default=200)
+    parser.add_argument("--statements", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=1000, help="steps per slice")
+    args = parser.parse_args()
+
+    texts = [generate(statements=args.statements, seed=seed) for seed in range(args.programs)]
+    trees = [analyzed(text) for text in texts]
+    start = perf_counter()
+    outputs = []
+    for tree in trees:
+        out = OutputChannel.memory()
+        StacklessInterpreter(out).interpret(tree)
+        outputs.append(without_addresses(out.getvalue()))
+    sequential = perf_counter() - start
+
+    trees = [analyzed(text) for text in texts]
+    elapsed, tasks, _ = asyncio.run(interleaved(trees, args.budget, False))
+    same = all(without_addresses(task.interpreter.out.getvalue()) == output for task, output in zip(tasks, outputs))
+    trees = [analyzed(text) for text in texts]
+    _, tasks, progress = asyncio.run(interleaved(trees, args.budget, True))
+    steps = [task.steps for task in tasks]
+    # fairness: while every program was still running, how far apart were the slowest and fastest
+    spread = [max(row) - min(row) for row in progress if all(s < total for s, total in zip(row, steps))]
+    print('{} programs, {} to {} steps each, slices of {} steps'.format(
+        len(tasks), min(steps), max(steps), args.budget))
+    print('sequential {:.3f}s, interleaved {:.3f}s ({:+.1%}), same output: {}'.format(
+        sequential, elapsed, elapsed / sequential - 1, same))
+    print('{} slices, widest step gap while all ran: {}'.format(
+        sum(task.slices for task in tasks), max(spread, default=0)))
+
+
+if __name__ == '__main__':
+    main()
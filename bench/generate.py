@@ -0,0 +1,115 @@
+"""
+Synthetic mylang programs for the benchmark suite.
+
+    python bench/generate.py [--statements N] [--nesting D] [--expr-depth E]
+                             [--string-length L] [--branches B] [--recursion R] [--seed S]
+"""
+import argparse
+import random
+
+
+DEFAULTS = {
+    'statements': 200,      # top level statement groups
+    'nesting': 2,           # Defuns nested inside each other
+    'expr_depth': 4,        # parenthesised levels of every generated expression
+    'string_length': 16,    # characters of every string literal
+    'branches': 3,          # if/elif arms of every condition
+    'recursion': 20,        # depth of the non-tail recursive helper
+}
+
+
+def expression(rng, depth, names):
+    """nested + - * expression over 'names', division is left out so it can't divide by zero"""
+    if depth <= 0:
+        if names and rng.random() < 0.6:
+            return rng.choice(names)
+        return str(rng.randint(1, 9))
+    op = rng.choice('+-*')
+    left = expression(rng, depth - 1, names)
+    right = expression(rng, depth - 1, names) if op != '*' else str(rng.randint(1, 3))
+    return '({} {} {})'.format(left, op, right)
+
+
+def condition(rng, branches, variable, expr_depth, indent):
+    """if/elif chain where every condition is 0 at run time, so all of them are tested and 'else' runs"""
+    pad = '    ' * indent
+    lines = []
+    for i in range(branches):
+        keyword = 'if' if i == 0 else 'elif'
+        lines.append('{}{} {} * 0 then'.format(pad, keyword, variable))
+        lines.append('{}    {} = {}'.format(pad, variable, expression(rng, expr_depth, [variable])))
+    lines.append('{}else'.format(pad))
+    lines.append('{}    {} = {} + 1'.format(pad, variable, variable))
+    lines.append('{}end'.format(pad))
+    return lines
+
+
+def nested_defun(rng, name, nesting, expr_depth, branches):
+    """'nesting' Defuns inside each other, each calling the next one down"""
+    lines = []
+    names = []
+    for level in range(nesting):
+        pad = '    ' * level
+        param = 'p{}'.format(level)
+        names.append(param)
+        lines.append('{}def {}{}({})'.format(pad, name, level, param))
+        lines.append('{}    v{} = {}'.format(pad, level, expression(rng, expr_depth, names[-1:])))
+        lines.extend(condition(rng, branches, 'v{}'.format(level), 1, level + 1))
+    for level in reversed(range(nesting)):
+        pad = '    ' * level
+        if level + 1 < nesting:
+            lines.append('{}    {}{}(v{})'.format(pad, name, level + 1, level))
+        lines.append('{}end'.format(pad))
+    return lines
+
+
+def generate(statements=None, nesting=None, expr_depth=None, string_length=None, branches=None,
+             recursion=None, seed=0):
+    """source text of a program shaped by the DEFAULTS parameters"""
+    params = dict(DEFAULTS)
+    for key, value in (('statements', statements), ('nesting', nesting), ('expr_depth', expr_depth),
+                       ('string_length', string_length), ('branches', branches), ('recursion', recursion)):
+        if value is not None:
+            params[key] = value
+    rng = random.Random(seed)
+    nesting = max(params['nesting'], 1)
+    text = 'x' * params['string_length']
+
+    lines = ['# generated by bench/generate.py {}'.format(
+        ' '.join('{}={}'.format(key, value) for key, value in sorted(params.items()))),
+        'acc = 1',
+        's = "{}"'.format(text)]
+    # not a tail call, every level keeps its activation record
+    lines.extend(['def down(n)',
+                  '    if n then',
+                  '        down(n - 1)',
+                  '        n',
+                  '    end',
+                  'end'])
+    lines.extend(nested_defun(rng, 'f', nesting, params['expr_depth'], params['branches']))
+    for i in range(params['statements']):
+        kind = i % 4
+        if kind == 0:
+            lines.append('a{} = {}'.format(i, expression(rng, params['expr_depth'], ['acc'])))
+        elif kind == 1:
+            lines.append('f0({})'.format(rng.randint(1, 9)))
+        elif kind == 2:
+            lines.append('t{} = s + "{}"'.format(i, text))
+        else:
+            lines.extend(condition(rng, params['branches'], 'acc', params['expr_depth'], 0))
+    lines.append('down({})'.format(params['recursion']))
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="print a synthetic mylang program")
+    for key, value in DEFAULTS.items():
+        parser.add_argument('--' + key.replace('_', '-'), type=int, default=value)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(generate(args.statements, args.nesting, args.expr_depth, args.string_length, args.branches,
+                   args.recursion, args.seed), end='')
+
+
+if __name__ == '__main__':
+    main()
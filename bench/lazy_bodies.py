@@ -0,0 +1,73 @@
+"""
+Check that --lazy runs a program as the eager front end does: a skimmed body resolves names
+against the scope at its def, so it is accepted or refused alike once called. A body that is
+never called is only lexed and matched to its end, its errors go unreported by design.
+
+    python bench/lazy_bodies.py [--engines NAME ...]
+
+Exits with status 1 when a check fails.
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mylang import run_text
+from Output import OutputChannel
+
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', '*.txt')
+SAME = {
+    'global defined after the def': 'def f()\n  y\nend\ny = 2\nf()\n',
+    'function defined after the def': 'def f(a)\n  g(a)\nend\ndef g(b)\n  b\nend\nf(1)\n',
+    'outer assignment and nested def': 'x = 1\ndef f(a)\n  x = a\n  z = x + 1\n  def f2()\n    z + x\n  end\n'
+                                       '  f2()\nend\nf(5)\nx\n',
+    'recursion': 'def down(n)\n  if n then\n    down(n - 1)\n  else\n    0\n  end\nend\ndown(3)\n',
+    'redefinition': 'def f()\n  1\nend\ndef g()\n  f()\nend\ndef f()\n  2\nend\ng()\n',
+    'syntax error in a called body': 'def f()\n  1 +\nend\nf()\n',
+}
+UNCALLED = 'def f()\n  1 +\n  y\nend\n2\n'     # refused eagerly, runs lazily: the body is never parsed
+ADDRESS = re.compile(r' at 0x[0-9a-f]+')    # node reprs in the output
+
+
+def outcome(source, engine, lazy):
+    """program output, or the error it stopped with"""
+    out = OutputChannel.memory()
+    try:
+        run_text(source, engine=engine, out=out, lazy=lazy)
+    except Exception as e:
+        return 'error: {}'.format(ADDRESS.sub('', str(e)))
+    return ADDRESS.sub('', out.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check --lazy runs programs as the eager front end does")
+    parser.add_argument("--engines", nargs="+", choices=['tree', 'stack'], default=['tree', 'stack'])
+    args = parser.parse_args()
+
+    programs = dict(SAME)
+    for path in sorted(glob.glob(TESTS)):
+        with open(path) as f:
+            programs['test/' + os.path.basename(path)] = f.read()
+    failed = 0
+    for engine in args.engines:
+        problems = []
+        for name, source in programs.items():
+            eager, lazy = outcome(source, engine, False), outcome(source, engine, True)
+            if eager != lazy:
+                problems.append('{}: {!r} eagerly, {!r} with --lazy'.format(name, eager[:60], lazy[:60]))
+        if not outcome(UNCALLED, engine, False).startswith('error:'):
+            problems.append('an uncalled body with a syntax error was accepted eagerly')
+        if outcome(UNCALLED, engine, True).startswith('error:'):
+            problems.append('an uncalled body was parsed with --lazy')
+        print('{:>8}  {} programs  {}'.format(
+            engine, len(programs), 'FAILED: ' + '; '.join(problems) if problems else 'ok'))
+        failed += bool(problems)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
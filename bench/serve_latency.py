@@ -0,0 +1,91 @@
+"""
+Latency of one script run: a cold mylang.py process against mylang.py --serve, reached from a
+Client.py process and from a connection kept open in this process.
+
+    python bench/serve_latency.py [--file FILE] [--runs N] [--workers N]
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from time import perf_counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from Client import Client
+
+
+def timed(run, runs):
+    """milliseconds of every call of run()"""
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        run()
+        times.append((perf_counter() - start) * 1000)
+    return times
+
+
+def summary(name, times):
+    times = sorted(times)
+    return '{:<24} median {:>8.2f} ms  p95 {:>8.2f} ms  min {:>8.2f} ms'.format(
+        name, statistics.median(times), times[int(0.95 * (len(times) - 1))], times[0])
+
+
+def wait_for(path, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            Client(path).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise Exception("ServerError: nothing listening on {} after {}s".format(path, timeout))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cold CLI runs against served runs")
+    parser.add_argument("--file", type=str, default=os.path.join(ROOT, 'test', 'test02.txt'))
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    mylang = os.path.join(ROOT, 'mylang.py')
+    client = os.path.join(ROOT, 'Client.py')
+    with open(args.file) as f:
+        source = f.read()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'mylang.sock')
+        cache_dir = os.path.join(directory, 'cache')
+        results = [
+            summary('cold cli, no cache', timed(lambda: subprocess.run(
+                [sys.executable, mylang, '--file', args.file, '--no-cache'],
+                stdout=subprocess.DEVNULL, check=True), args.runs)),
+            summary('cold cli, warm cache', timed(lambda: subprocess.run(
+                [sys.executable, mylang, '--file', args.file, '--cache-dir', cache_dir],
+                stdout=subprocess.DEVNULL, check=True), args.runs)),
+        ]
+        server = subprocess.Popen([sys.executable, mylang, '--serve', '--socket', path,
+                                   '--workers', str(args.workers), '--cache-dir', cache_dir],
+                                  stderr=subprocess.DEVNULL)
+        try:
+            wait_for(path)
+            results.append(summary('Client.py process', timed(lambda: subprocess.run(
+                [sys.executable, client, '--socket', path, '--file', args.file],
+                stdout=subprocess.DEVNULL, check=True), args.runs)))
+            with Client(path) as connection:
+                results.append(summary('open connection', timed(
+                    lambda: connection.run(source, args.file), args.runs)))
+        finally:
+            server.send_signal(signal.SIGINT)     # lets the server stop its pool and remove the socket
+            server.wait()
+    print('{}: {} runs each'.format(args.file, args.runs))
+    print('\n'.join(results))
+
+
+if __name__ == '__main__':
+    main()
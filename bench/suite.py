@@ -0,0 +1,194 @@
+"""
+Time every front end stage and every engine on generated programs, and compare two runs.
+
+    python bench/suite.py run [--scale S] [--repeat R] [--scenarios NAME ...] [--engines NAME ...] [--out FILE]
+    python bench/suite.py compare BASE.json NEW.json [--threshold 0.1] [--min-seconds 0.01]
+
+'compare' exits with status 1 when a stage got slower than BASE by more than the threshold.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mylang import VERSION, Interpreter
+from Semantic import *
+from Optimizer import ConstantFolder
+from Output import OutputChannel
+from Stackless import StacklessInterpreter
+from VM import Compiler, VM
+from Closure import ClosureCompiler
+from generate import generate
+
+
+# each scenario stretches one generate() parameter, the others keep their defaults
+SCENARIOS = {
+    'mixed': {},
+    'statements': {'statements': 4000},
+    'nesting': {'nesting': 30, 'statements': 400},
+    'expressions': {'expr_depth': 8, 'statements': 400},
+    'strings': {'string_length': 4096, 'statements': 400},
+    'branches': {'branches': 40, 'statements': 400},
+    'recursion': {'recursion': 100, 'statements': 40},
+}
+
+
+def run_tree(tree):
+    Interpreter(OutputChannel.memory()).interpret(tree)
+
+
+def run_stack(tree):
+    StacklessInterpreter(OutputChannel.memory()).interpret(tree)
+
+
+def run_vm(tree):
+    VM(OutputChannel.memory()).run(Compiler().compile(tree))
+
+
+def run_closure(tree):
+    ClosureCompiler(OutputChannel.memory()).compile(tree)()
+
+
+ENGINES = {'tree': run_tree, 'stack': run_stack, 'vm': run_vm, 'closure': run_closure}
+
+
+def best(repeat, run, setup=None):
+    """fastest of 'repeat' timed runs of run(setup()), setup is not timed"""
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = perf_counter()
+        run(arg)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def measure(text, repeat, engines):
+    """{'stage': seconds}, {'stage': error message} for one program"""
+    times, errors = {}, {}
+
+    def lexed():
+        return list(RegexLexer(text).tokens())
+
+    def parsed():
+        return Parser(text).parse()
+
+    def analyzed():
+        tree = parsed()
+        SemanticAnalyzer().visit(tree)
+        return tree
+
+    def optimized():
+        tree = analyzed()
+        ConstantFolder().optimize(tree)
+        return tree
+
+    stages = [
+        ('lex', lambda _: lexed(), None),
+        ('parse', lambda tokens: Parser(text, tokens=tokens).parse(), lexed),     # the tokens lexed up front
+        ('analyze', lambda tree: SemanticAnalyzer().visit(tree), parsed),
+        ('optimize', lambda tree: ConstantFolder().optimize(tree), analyzed),
+    ]
+    stages.extend(('engine.' + name, ENGINES[name], optimized) for name in engines)
+    for name, run, setup in stages:
+        try:
+            times[name] = best(repeat, run, setup)
+        except Exception as e:     # RecursionError, StackOverflow, ...: record it, keep measuring
+            errors[name] = '{}: {}'.format(type(e).__name__, e)
+    return times, errors
+
+
+def run_suite(args):
+    results = {
+        'version': VERSION,
+        'python': platform.python_version(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'repeat': args.repeat,
+        'scale': args.scale,
+        'scenarios': {},
+    }
+    for name in args.scenarios:
+        params = dict(SCENARIOS[name])
+        params['statements'] = max(1, int(params.get('statements', 200) * args.scale))
+        text = generate(**params)
+        times, errors = measure(text, args.repeat, args.engines)
+        results['scenarios'][name] = {'params': params, 'lines': text.count('\n'), 'times': times, 'errors': errors}
+        print('{:<12} {}'.format(name, '  '.join('{} {:.4f}s'.format(stage, seconds)
+                                                for stage, seconds in times.items())), file=sys.stderr)
+        for stage, error in errors.items():
+            print('{:<12} {} failed: {}'.format(name, stage, error), file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = 0
+    print('{:<12} {:<16} {:>10} {:>10} {:>8}'.format('scenario', 'stage', 'base(s)', 'new(s)', 'change'))
+    for scenario, old_result in base['scenarios'].items():
+        new_result = new['scenarios'].get(scenario)
+        if new_result is None:
+            print('{:<12} missing from {}'.format(scenario, args.new))
+            continue
+        if old_result['params'] != new_result['params']:
+            print('{:<12} generated with other parameters, skipped'.format(scenario))
+            continue
+        for stage, before in old_result['times'].items():
+            after = new_result['times'].get(stage)
+            if after is None:
+                print('{:<12} {:<16} {:>10.4f} {:>10} {}'.format(
+                    scenario, stage, before, '-', new_result['errors'].get(stage, 'missing')))
+                regressions += 1
+                continue
+            change = (after - before) / before if before else 0.0
+            flag = ''
+            if change > args.threshold and max(before, after) >= args.min_seconds:
+                flag = 'REGRESSION'
+                regressions += 1
+            print('{:<12} {:<16} {:>10.4f} {:>10.4f} {:>+7.1%} {}'.format(scenario, stage, before, after,
+                                                                          change, flag))
+    if regressions:
+        print('{} stage(s) regressed beyond {:.0%}'.format(regressions, args.threshold))
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mylang benchmark suite")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="time the stages and engines, write the results as JSON")
+    run.add_argument("--scale", type=float, default=1.0, help="multiplies the statements of every scenario")
+    run.add_argument("--repeat", type=int, default=3, help="timed runs per stage, the fastest is kept")
+    run.add_argument("--scenarios", nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    run.add_argument("--engines", nargs='+', choices=list(ENGINES), default=list(ENGINES))
+    run.add_argument("--out", type=str, help="results file, stdout if not given")
+
+    cmp = commands.add_parser('compare', help="flag stages slower in NEW than in BASE")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, 0.1 is 10%%")
+    cmp.add_argument("--min-seconds", type=float, default=0.01,
+                     help="stages faster than this in both runs are too noisy to flag")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run_suite(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Check that tail calls run in constant space on every engine: test/tail.txt must keep the call
+stack flat, and the memory peak of a tail-recursive loop must not grow with its iterations.
+With --no-tco the same loop has to stop with a stack overflow instead.
+
+    python bench/tail_calls.py [--engines NAME ...] [--iterations N]
+
+Exits with status 1 when a check fails.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mylang import run_text
+from Semantic import StackOverflow
+from Output import OutputChannel
+from Stats import PipelineStats
+
+
+TAIL = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'tail.txt')
+LOOP = '''
+def loop(n, acc)
+    if n then
+        loop(n - 1, acc + 1)
+    else
+        acc
+    end
+end
+loop({}, 0)
+'''
+MAX_DEPTH = 10000
+FLAT = 3            # program record, a function and the nested function of a mutual recursion
+GROWTH = 1.5        # a peak this much higher for 10x the iterations is not constant
+
+
+def run(source, engine, tco=True, trace_memory=False):
+    """(call stack peak, execute phase memory peak or None)"""
+    stats = PipelineStats(trace_memory)
+    stats.start()
+    try:
+        run_text(source, engine=engine, out=OutputChannel.memory(), max_depth=MAX_DEPTH, tco=tco, stats=stats)
+    finally:
+        stats.stop()
+    peak = next((phase.get('peak') for phase in stats.phases if phase['name'] == 'execute'), None)
+    return stats.peak_depth, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check tail calls run in constant space")
+    parser.add_argument("--engines", nargs="+", choices=['tree', 'vm', 'closure', 'stack'],
+                        default=['tree', 'vm', 'closure', 'stack'])
+    parser.add_argument("--iterations", type=int, default=100000,
+                        help="iterations of the larger loop, the smaller one runs a tenth of them")
+    args = parser.parse_args()
+
+    with open(TAIL) as f:
+        tail = f.read()
+    small = max(args.iterations // 10, 1)
+    failed = 0
+    for engine in args.engines:
+        depth, _ = run(tail, engine)
+        _, small_peak = run(LOOP.format(small), engine, trace_memory=True)
+        _, large_peak = run(LOOP.format(args.iterations), engine, trace_memory=True)
+        try:
+            run(LOOP.format(MAX_DEPTH * 2), engine, tco=False)
+            overflow = False
+        except StackOverflow:
+            overflow = True
+        problems = []
+        if depth > FLAT:
+            problems.append('test/tail.txt reached call depth {}'.format(depth))
+        if large_peak > small_peak * GROWTH:
+            problems.append('memory peak grew from {} to {} bytes'.format(small_peak, large_peak))
+        if not overflow:
+            problems.append('--no-tco ran {} nested calls without a stack overflow'.format(MAX_DEPTH * 2))
+        print('{:>8}  tail.txt depth {:>2}  peak {:>8} B at {} calls, {:>8} B at {}  no-tco overflow: {}  {}'.format(
+            engine, depth, small_peak, small, large_peak, args.iterations, overflow,
+            'FAILED: ' + '; '.join(problems) if problems else 'ok'))
+        failed += bool(problems)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Per-node cost of NodeVisitor.visit: the cached per-class dispatch table against the
+previous 'visit_' + type(node).__name__ / getattr lookup on every visit.
+
+    python bench/visitor_dispatch.py [--nodes N] [--repeat R]
+"""
+import argparse
+import os
+import platform
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Lexer import Token
+from Semantic import *
+
+
+class LegacyDispatch(NodeVisitor):
+    def visit(self, node):
+        method_name = 'visit_' + type(node).__name__
+        visitor = getattr(self, method_name, self.generic_visit)
+        return visitor(node)
+
+
+class Counter:
+    """visits a flat expression list without doing any work, so only dispatch is measured"""
+    def visit_Num(self, node):
+        pass
+
+    def visit_Var(self, node):
+        pass
+
+    def visit_BinOp(self, node):
+        pass
+
+
+class LegacyCounter(Counter, LegacyDispatch):
+    pass
+
+
+class CachedCounter(Counter, NodeVisitor):
+    pass
+
+
+def make_nodes(count):
+    nodes = []
+    for i in range(count):
+        if i % 3 == 0:
+            nodes.append(Num(Token('INT', i)))
+        elif i % 3 == 1:
+            nodes.append(Var(Token('IDENT', 'x')))
+        else:
+            nodes.append(BinOp(nodes[-2], Token('OP', '+'), nodes[-1]))
+    return nodes
+
+
+def per_node_ns(visitor, nodes, repeat):
+    visit = visitor.visit
+
+    def run():
+        for node in nodes:
+            visit(node)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / len(nodes) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NodeVisitor dispatch micro-benchmark")
+    parser.add_argument("--nodes", type=int, default=300000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    nodes = make_nodes(args.nodes)
+    before = per_node_ns(LegacyCounter(), nodes, args.repeat)
+    after = per_node_ns(CachedCounter(), nodes, args.repeat)
+    print('{} {}, {} nodes (Num, Var, BinOp in turn), best of {} timeit runs, visits that do no work'.format(
+        platform.python_implementation(), platform.python_version(), len(nodes), args.repeat))
+    print('getattr dispatch : {:8.1f} ns/node'.format(before))
+    print('cached dispatch  : {:8.1f} ns/node'.format(after))
+    print('speedup          : {:8.2f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
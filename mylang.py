@@ -1,10 +1,48 @@
 from Semantic import *
+from Cache import ProgramCache
+from VM import Compiler, VM
+from Closure import ClosureCompiler
+from Stackless import StacklessInterpreter
+from Trace import LEVELS, FileSink, RingBufferSink, StdoutSink
+from Output import OutputChannel
+from Optimizer import ConstantFolder
+from Memo import Memoizer, memo_key
+from Lazy import materialize
+from Incremental import IncrementalParser
+from Stream import stream_program
+from Server import ProgramServer
+from Client import DEFAULT_SOCKET
+from Jit import Jit
+from Profile import Profile, Profiling
+from Budget import Budget, BudgetExceeded, Budgeted, BudgetedStackless
+from Stats import PipelineStats, count_nodes
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter, sleep
 import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+
+
+VERSION = '0.1'
 
 
 class Interpreter(NodeVisitor):
-    def __init__(self):
-        self.call_stack = CallStack()
+    def __init__(self, out=None, max_depth=None, tco=True, memo=None, jit=None):
+        """
+        memo: Memoizer giving every pure function a cache of the arguments it already ran with
+        jit: Jit compiling the bodies of hot functions to Python
+        """
+        self.call_stack = CallStack(max_depth)
+        self.out = OutputChannel() if out is None else out
+        self.tco = tco
+        self.memo = memo
+        self.jit = jit
+        self.tail_call = None   # (function, record, cache, key) left by a call in tail position for its caller to run
 
     def visit_NoOp(self, node):     # dummy node
         return "No operation."
@@ -31,13 +69,13 @@ class Interpreter(NodeVisitor):
             return -self.visit(node.expr)
 
     def visit_Num(self, node):
-        return node.value
+        return node.token.value     # the value property is a call, this runs for every constant
 
     def visit_Bool(self, node):
-        return node.value
+        return node.token.value
 
     def visit_String(self, node):
-        return node.value
+        return node.token.value
 
     def visit_Program(self, node):
 
@@ -45,97 +83,653 @@ class Interpreter(NodeVisitor):
             name="mylang",
             type=ARType.PROGRAM,
             nesting_level=1,
+            nslots=node.nslots,
         )
         self.call_stack.push(ar)
-        self.visit(node.block)
+        write = self.out.write
+        for statement in node.block.statements:     # top level results are the program output
+            write(self.visit(statement))
         self.call_stack.pop()
 
     def visit_Block(self, node):
         for statement in node.statements:
-            print(self.visit(statement))
+            result = self.visit(statement)
+            if tracer.level >= TraceLevel.ALL:
+                tracer.emit(str(result))
 
     def visit_Assign(self, node):
         var_name = node.left.value
         var_value = self.visit(node.right)
         ar = self.call_stack.peek()
-        ar[var_name] = var_value
+        depth = node.depth
+        while depth:
+            ar = ar.enclosing
+            depth -= 1
+        ar.slots[node.slot] = var_value
         return "Assign {} with {}".format(var_name, var_value)
 
     def visit_Var(self, node):
-        var_name = node.value
-
         ar = self.call_stack.peek()
-        var_value = ar[var_name]
+        depth = node.depth
+        while depth:
+            ar = ar.enclosing
+            depth -= 1
+        var_value = ar.slots[node.slot]
         if var_value is None:   # right now, 'None' is not assignable
-            raise Exception("Undefined identifier: " + var_name)
+            raise Exception("Undefined identifier: " + node.value)
         else:
             return var_value
 
     def visit_FunCall(self, node):
         proc_name = node.token.value
-        cur_ar = self.call_stack.peek()
-        proc_symbol = cur_ar[proc_name]
+        proc_symbol = self.call_stack.peek().outer(node.depth).slots[node.slot]
+        if proc_symbol.lazy is not None:    # first call of a function skimmed by --lazy
+            materialize(proc_symbol)
 
         ar = ActivationRecord(
             name=proc_name,
             type=ARType.PROCEDURE,
-            nesting_level=proc_symbol.scope_level + 1
+            nesting_level=proc_symbol.scope_level + 1,
+            nslots=proc_symbol.nslots,
+            enclosing=proc_symbol.access_link,
         )
 
         formal_params = proc_symbol.formal_params
         actual_params = node.actual_params
-        for param_symbol, argument_node in zip(formal_params, actual_params):
-            ar[param_symbol.token.value] = self.visit(argument_node)
+        for param, argument_node in zip(formal_params, actual_params):
+            ar.slots[param.slot] = self.visit(argument_node)
+        memo = proc_symbol.memo
+        key = None
+        if memo is not None:
+            if tracer.level >= TraceLevel.ALL:     # a skipped body would trace nothing
+                memo = None
+            else:
+                key = memo_key([ar.slots[param.slot] for param in formal_params])
+                if key in memo:
+                    return "Call {}, params {}".format(node.token.value, node.actual_params)
+        if node.tail and self.tco:
+            # nothing runs after this call in the current body, so the caller below
+            # continues with it in place of the current record instead of nesting
+            self.tail_call = (proc_symbol, ar, memo, key)
+            return "Call {}, params {}".format(node.token.value, node.actual_params)
         self.call_stack.push(ar)
-        self.visit(proc_symbol.block_ast)
+        result = self.run_body(proc_symbol, ar)
+        pending = None      # (cache, key) of the pure calls run in place, they all end with this result
+        while self.tail_call is not None:
+            proc_symbol, ar, tail_memo, tail_key = self.tail_call
+            self.tail_call = None
+            if tail_memo is not None:
+                if pending is None:
+                    pending = deque(maxlen=self.memo.capacity)
+                pending.append((tail_memo, tail_key))
+            self.call_stack.replace(ar)
+            result = self.run_body(proc_symbol, ar)
         self.call_stack.pop()
+        if pending is not None:
+            for tail_memo, tail_key in pending:
+                tail_memo.put(tail_key, result)
+        if memo is not None:
+            memo.put(key, result)
         return "Call {}, params {}".format(node.token.value, node.actual_params)
 
+    def run_body(self, proc_symbol, ar):
+        if self.jit is not None:
+            return self.jit.run(self, proc_symbol, ar)
+        return self.visit(proc_symbol.block_ast)
+
     def visit_Defun(self, node):
         proc_name = node.token.value
         proc_symbol = FunSymbol(proc_name)
         proc_symbol.formal_params = node.formal_params
 
         proc_symbol.block_ast = node.block
+        proc_symbol.nslots = node.nslots
+        if node.block is None:
+            proc_symbol.lazy = node
+        if node.pure and self.memo is not None:
+            proc_symbol.memo = self.memo.cache(proc_name)
 
         current_ar = self.call_stack.peek()
-        current_ar[proc_name] = proc_symbol
+        proc_symbol.access_link = current_ar
+        current_ar.slots[node.slot] = proc_symbol
         return "define {}".format(proc_name)
 
     def visit_CondPair(self, node):
-        if self.visit(node.cond) not in [0, False, None]:
+        if self.visit(node.cond) not in FALSY:
             return node.block
         else:
             return None
 
     def visit_Condition(self, node):
         for pair in node.pair_list:
-            res = self.visit(pair)
-            if res:
-                return res
-        return node.else_block
+            block = self.visit(pair)
+            if block:
+                return self.visit(block)
+        if node.else_block is not None:
+            return self.visit(node.else_block)
 
     def interpret(self, tree):
-        return self.visit(tree)
+        try:
+            with python_stack(self.call_stack):
+                return self.visit(tree)
+        finally:
+            self.out.flush()
 
 
-def parse_file(path):
-    with open(path) as f:
-        text = f.read()
-        tree = Parser(text).parse()
+class ProfilingInterpreter(Profiling, Interpreter):
+    """Interpreter recording a Profile, only used with --profile"""
+
+
+class BudgetedInterpreter(Budgeted, Interpreter):
+    """Interpreter enforcing a Budget, only used when a limit is given"""
+
+
+class ProfilingBudgetedInterpreter(Profiling, Budgeted, Interpreter):
+    """Interpreter recording a Profile and enforcing a Budget"""
+
+
+class BudgetedStacklessInterpreter(BudgetedStackless, StacklessInterpreter):
+    """StacklessInterpreter enforcing a Budget, only used when a limit is given"""
+
+
+class OptionError(ValueError):
+    """options that cannot run together, refused before anything runs"""
+
+
+def option_conflict(engine, jit=None, profile=None, stream=False, budget=None):
+    """why the options cannot run on 'engine', None when they can"""
+    if stream and engine not in ('tree', 'stack'):
+        return "--stream runs the tree and stack engines, the {} engine compiles the whole program first".format(engine)
+    if profile is not None and engine != 'tree':
+        return "only the tree engine is profiled, not the {} engine".format(engine)
+    if jit is not None and engine != 'tree':
+        return "only the tree engine has a jit, not the {} engine".format(engine)
+    if budget is not None and budget.counts():  # a depth alone is kept by every CallStack
+        if engine not in ('tree', 'stack'):
+            return "the {} engine only enforces a max_depth budget".format(engine)
+        if jit is not None:
+            return "bodies compiled by the jit are not counted by a budget, run without it"
+    return None
+
+
+def check_options(engine, jit=None, profile=None, stream=False, budget=None):
+    conflict = option_conflict(engine, jit, profile, stream, budget)
+    if conflict is not None:
+        raise OptionError("OptionError: " + conflict)
+
+
+def interpreter(engine='tree', out=None, max_depth=None, tco=True, memo=None, jit=None, profile=None, budget=None):
+    """the tree or stack engine with the hooks the options need, and only those, see check_options()"""
+    if budget is not None and not budget.counts():
+        budget = None   # a depth alone is kept by the CallStack, enforced() reports its overflow
+    if engine == 'stack' and budget is not None:
+        return BudgetedStacklessInterpreter(out, max_depth, tco, memo, budget=budget)
+    if engine == 'stack':
+        return StacklessInterpreter(out, max_depth, tco, memo)
+    if profile is not None and budget is not None:
+        return ProfilingBudgetedInterpreter(out, max_depth, tco, memo, jit, profile=profile, budget=budget)
+    if profile is not None:
+        return ProfilingInterpreter(out, max_depth, tco, memo, jit, profile=profile)
+    if budget is not None:
+        return BudgetedInterpreter(out, max_depth, tco, memo, jit, budget=budget)
+    return Interpreter(out, max_depth, tco, memo, jit)
+
+
+BUDGET_LIMITS = ('max_nodes', 'max_depth', 'max_string', 'max_alloc', 'timeout')   # request and CLI options of a Budget
+DEFAULT_MAX_DEPTH = 10000   # call depth of a run given no max_depth, a plain StackOverflow past it
+
+
+def request_budget(options):
+    """Budget for the BUDGET_LIMITS in 'options', or None when no limit is given"""
+    limits = {name: options.get(name) for name in BUDGET_LIMITS if options.get(name) is not None}
+    if not limits:
+        return None
+    return Budget(**limits)
+
+
+def enforced(budget, call_stack):
+    """context of a run on 'call_stack' under 'budget', which may be None"""
+    return nullcontext() if budget is None else budget.running(call_stack)
+
+
+LEXERS = {'regex': RegexLexer, 'char': Lexer}
+CACHE_DIR = '__mylangcache__'
+
+
+def front_end_version():
+    """VERSION plus a digest of the modules that shape the analyzed tree"""
+    digest = hashlib.sha256(VERSION.encode())
+    here = os.path.dirname(os.path.abspath(__file__))
+    for module in ('Lexer.py', 'Parser.py', 'Semantic.py'):
+        with open(os.path.join(here, module), 'rb') as f:
+            digest.update(f.read())
+    return '{}-{}'.format(VERSION, digest.hexdigest()[:16])
+
+
+def default_cache(path, directory=None):
+    """cache in 'directory', or next to the script like __pycache__"""
+    if directory is None:
+        directory = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    return ProgramCache(directory, front_end_version())
+
 
+def configure_trace(level, path=None, buffer=None):
+    if path:
+        sink = FileSink(path)
+    elif buffer:
+        sink = RingBufferSink(buffer)
+    else:
+        sink = None
+    tracer.configure(LEVELS[level], sink)
+
+
+def no_phase(name):
+    return nullcontext()
+
+
+def analyze(text, lexer='regex', stats=None, lazy=False):
+    """
+    stats: PipelineStats, lexing is then done up front so it can be timed on its own
+    lazy: only skim function bodies, they are parsed and analyzed on their first call, against
+          the scope at their def; errors in a body that is never called go unreported
+    """
+    if stats is None:
+        tree = Parser(text, lexer=LEXERS[lexer], lazy=lazy).parse()
         semantic_analyzer = SemanticAnalyzer()
         semantic_analyzer.visit(tree)
+        return tree
+    with stats.phase('lex'):
+        tokens = list(LEXERS[lexer](text).tokens())
+    stats.tokens = len(tokens)
+    with stats.phase('parse'):
+        tree = Parser(text, lexer=LEXERS[lexer], tokens=tokens, lazy=lazy).parse()
+    with stats.phase('analyze'):
+        semantic_analyzer = SemanticAnalyzer()
+        semantic_analyzer.visit(tree)
+    stats.scopes = semantic_analyzer.scopes
+    stats.nodes = count_nodes(tree)
+    return tree
+
+
+def parse_file(path, lexer='regex', engine='tree', out=None, cache=None, optimize=True, opt_stats=False,
+               max_depth=None, tco=True, memo=None, jit=None, profile=None, stats=None, lazy=False,
+               budget=None):
+    """
+    cache: a ProgramCache holding analyzed trees, warm runs skip lexing, parsing and analysis
+    optimize: fold constants and prune dead branches before execution
+    opt_stats: report what the optimizer did on stderr
+    max_depth: mylang call depth at which a StackOverflow is raised, a BudgetExceeded if it is the budget's
+    tco: run calls in tail position without growing the call stack
+    memo: Memoizer for pure functions, honored by the tree and stack engines
+    jit: Jit for hot functions, honored by the tree engine
+    profile: Profile to record into, runs the tree engine with the profiling hooks, other engines raise
+    stats: PipelineStats to record phase timings, allocations, node counts and call depth into
+    lazy: parse function bodies on their first call, honored by the tree and stack engines
+    budget: Budget whose limits raise BudgetExceeded, enforced by the tree and stack engines without jit
+    """
+    phase = no_phase if stats is None else stats.phase
+    with phase('read'):
+        with open(path) as f:
+            text = f.read()
+    run_text(text, lexer, engine, out, cache, optimize, opt_stats, max_depth, tco, memo, jit, profile, stats, lazy,
+             budget)
+
+
+def run_text(text, lexer='regex', engine='tree', out=None, cache=None, optimize=True, opt_stats=False,
+             max_depth=None, tco=True, memo=None, jit=None, profile=None, stats=None, lazy=False, budget=None):
+    """parse_file for source text already in memory"""
+    if engine not in ('tree', 'stack'):
+        lazy = False    # the compilers need every body up front
+    if lazy:
+        cache = None    # a skimmed tree still holds tokens and analysis scopes
+    phase = no_phase if stats is None else stats.phase
+    tree = None
+    if cache is not None:
+        with phase('cache load'):
+            key = cache.key(text)
+            tree = cache.load(key)
+    if tree is None:
+        tree = analyze(text, lexer, stats, lazy)
+        if cache is not None:
+            with phase('cache store'):
+                cache.store(key, tree)
+    execute(tree, engine, out, optimize, opt_stats, max_depth, tco, memo, jit, profile, stats, budget)
+
+
+def execute(tree, engine='tree', out=None, optimize=True, opt_stats=False, max_depth=None, tco=True, memo=None,
+            jit=None, profile=None, stats=None, budget=None):
+    """optimize and run an analyzed tree, the options are those of parse_file"""
+    check_options(engine, jit, profile, budget=budget)
+    if budget is not None:
+        max_depth = budget.call_stack_depth(max_depth)
+    phase = no_phase if stats is None else stats.phase
+    if optimize:
+        with phase('optimize'):
+            folder = ConstantFolder()
+            folder.optimize(tree)
+        if opt_stats:
+            print('optimizer: folded {folded} expressions, removed {noops} no-ops, '
+                  'pruned {branches} branches'.format(**folder.stats), file=sys.stderr)
+        if stats is not None:
+            stats.optimized_nodes = count_nodes(tree)
+
+    if engine == 'vm':
+        with phase('compile'):
+            code = Compiler(tco).compile(tree)
+        runner = VM(out, max_depth)
+        with phase('execute'), enforced(budget, runner.call_stack):
+            runner.run(code)
+    elif engine == 'closure':
+        with phase('compile'):
+            runner = ClosureCompiler(out, max_depth, tco)
+            program = runner.compile(tree)
+        with phase('execute'), enforced(budget, runner.call_stack):
+            program()
+    else:
+        runner = interpreter(engine, out, max_depth, tco, memo, jit, profile, budget)
+        with phase('execute'), enforced(budget, runner.call_stack):
+            runner.interpret(tree)
+    if stats is not None:
+        stats.peak_depth = runner.call_stack.peak
+
+
+def stream_file(path, engine='tree', out=None, optimize=True, max_depth=None, tco=True, jit=None, lazy=False,
+                chunk_size=1 << 16, stats=None, profile=None, budget=None):
+    """
+    Run 'path' one top level statement at a time while it is being read, see Stream.stream_program.
+    Output starts with the first statement and a syntax error only stops the run where it is.
+    Purity is only known once every statement is in, so there is no memoization.
+    """
+    phase = no_phase if stats is None else stats.phase
+    check_options(engine, jit, profile, stream=True, budget=budget)
+    if budget is not None:
+        max_depth = budget.call_stack_depth(max_depth)
+    runner = interpreter(engine, out, max_depth, tco, jit=jit, profile=profile, budget=budget)
+    with open(path) as f:
+        with phase('stream'), enforced(budget, runner.call_stack):
+            runner.interpret(stream_program(f, runner.call_stack, optimize, lazy, chunk_size))
+    if stats is not None:
+        stats.peak_depth = runner.call_stack.peak
 
-        interpreter = Interpreter()
-        interpreter.interpret(tree)
+
+worker_cache = None     # ProgramCache of a --serve or --batch worker, every worker shares its directory
+
+
+def start_worker(cache_dir):
+    global worker_cache
+    if cache_dir is not None:
+        worker_cache = ProgramCache(cache_dir, front_end_version())
+
+
+def run_request(request):
+    """
+    Run one --serve request or --batch file in a pool worker.
+    request: {'source', 'name', and optionally 'engine', 'optimize', 'max_depth', 'tco' and BUDGET_LIMITS}
+    returns {'output', 'error', 'seconds'}, error is None when the program ran to its end,
+    and 'budget' with the partial statistics when a limit stopped it
+    """
+    out = OutputChannel.memory()
+    start = perf_counter()
+    error = None
+    response = {}
+    try:
+        engine = request.get('engine', 'tree')
+        if engine not in ('tree', 'vm', 'closure', 'stack'):
+            raise Exception("ServerError: unknown engine {}".format(engine))
+        max_depth = request.get('max_depth')
+        if max_depth is None:
+            max_depth = DEFAULT_MAX_DEPTH
+        run_text(request['source'], engine=engine, out=out, cache=worker_cache,
+                 optimize=request.get('optimize', True), max_depth=max_depth, tco=request.get('tco', True),
+                 budget=request_budget(request))
+    except BudgetExceeded as e:
+        error = str(e)
+        response['budget'] = dict(e.stats, limit=e.limit)
+    except Exception as e:     # the program's error goes back to the client, the worker stays up
+        error = str(e)
+    response.update(output=out.getvalue(), error=error, seconds=perf_counter() - start)
+    return response
+
+
+def serve(path=DEFAULT_SOCKET, workers=None, cache_dir=None):
+    """answer Client requests on the Unix socket 'path' until interrupted"""
+    server = ProgramServer(path, run_request, workers, start_worker, (cache_dir,))
+    print('serving on {} with {} workers'.format(path, workers or os.cpu_count()), file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def batch_files(pattern):
+    """the files of a directory, or the paths a glob pattern matches, in sorted order"""
+    if os.path.isdir(pattern):
+        paths = (os.path.join(pattern, name) for name in os.listdir(pattern))
+        return sorted(path for path in paths if os.path.isfile(path))
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+
+def run_file(job):
+    path, options = job
+    try:
+        with open(path) as f:
+            source = f.read()
+    except OSError as e:
+        return {'output': '', 'error': str(e), 'seconds': 0.0}
+    return run_request(dict(options, source=source, name=path))
+
+
+def run_batch(paths, workers=None, chunk_size=4, cache_dir=None, out=sys.stdout, report=sys.stderr, **options):
+    """
+    Run every file of 'paths' in a pool of worker processes. Outputs are written to 'out' in the
+    order of 'paths' as soon as all files before them are done, timings go to 'report'.
+    chunk_size: files handed to a worker at once, larger chunks cost less to hand out but balance worse
+    options: run_request options shared by every file
+    returns the number of files that failed
+    """
+    start = perf_counter()
+    failed = 0
+    busy = 0.0
+    with multiprocessing.Pool(workers, start_worker, (cache_dir,)) as pool:
+        jobs = ((path, options) for path in paths)
+        for path, result in zip(paths, pool.imap(run_file, jobs, chunk_size)):
+            out.write('==> {} <==\n'.format(path))
+            out.write(result['output'])
+            if result['error'] is not None:
+                failed += 1
+                out.write('error: {}\n'.format(result['error']))
+            busy += result['seconds']
+            print('{:>10.4f}s  {}{}'.format(result['seconds'], path, '  FAILED' if result['error'] else ''),
+                  file=report)
+    elapsed = perf_counter() - start
+    print('{} files, {} failed in {:.3f}s: {:.1f} files/s, {:.3f}s of runs over {} workers ({:.1f}x)'.format(
+        len(paths), failed, elapsed, len(paths) / elapsed if elapsed else 0.0, busy, workers or os.cpu_count(),
+        busy / elapsed if elapsed else 0.0), file=report)
+    out.flush()
+    return failed
+
+
+def watch(path, run, interval=0.5):
+    """
+    Run 'path' again every time it is saved, until interrupted. The IncrementalParser of the
+    previous run is kept, so a save only lexes and parses what it changed.
+    run: called with every analyzed Program
+    """
+    front_end = None
+    mtime = None
+    while True:
+        try:
+            current = os.stat(path).st_mtime_ns
+        except OSError:     # editors may replace the file while saving, look again next time
+            current = mtime
+        if current != mtime:
+            mtime = current
+            with open(path) as f:
+                text = f.read()
+            start = perf_counter()
+            try:
+                if front_end is None:
+                    front_end = IncrementalParser(text)
+                    tree = front_end.program()
+                else:
+                    tree = front_end.update(text)
+                SemanticAnalyzer().visit(tree)
+                print('--- {}: lexed {} tokens, parsed {} statements, kept {}, front end {:.4f}s'.format(
+                    path, front_end.relexed, front_end.reparsed, front_end.reused, perf_counter() - start),
+                    file=sys.stderr)
+                run(tree)
+            except Exception as e:     # report it and wait for the next save
+                print(e, file=sys.stderr)
+        sleep(interval)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="parse source file")
     parser.add_argument("--file", type=str, default="test/test02.txt")
+    parser.add_argument("--lexer", choices=sorted(LEXERS), default="regex")
+    parser.add_argument("--engine", choices=['tree', 'vm', 'closure', 'stack'], default="tree",
+                        help="tree walker, bytecode VM, closure compiler or explicit-stack evaluator")
+    parser.add_argument("--lazy", action="store_true",
+                        help="parse function bodies on their first call (tree and stack engines), skips the cache; "
+                             "errors in a body never called are not reported")
+    parser.add_argument("--serve", action="store_true",
+                        help="keep warm worker processes and run the scripts Client.py sends, until interrupted")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET, help="Unix socket of --serve")
+    parser.add_argument("--workers", type=int,
+                        help="worker processes of --serve and --batch, one per core by default")
+    parser.add_argument("--batch", type=str, metavar="DIR|GLOB",
+                        help="run every file of a directory or glob pattern over --workers processes, outputs "
+                             "in file order on stdout, timings on stderr; cached only with --cache-dir")
+    parser.add_argument("--batch-chunk", type=int, default=4, metavar="N",
+                        help="files handed to a --batch worker at once")
+    parser.add_argument("--stream", action="store_true",
+                        help="run each top level statement as soon as it is read (tree and stack engines)")
+    parser.add_argument("--chunk-size", type=int, default=1 << 16, metavar="CHARS",
+                        help="characters --stream reads from the file at a time")
+    parser.add_argument("--watch", action="store_true",
+                        help="run the file again on every save, only the edited lines go through the front end")
+    parser.add_argument("--watch-interval", type=float, default=0.5, metavar="SECONDS",
+                        help="how often --watch looks at the modification time")
+    parser.add_argument("--max-depth", type=int,
+                        help="mylang call depth at which the program stops with a BudgetError, without it "
+                             "a stack overflow stops it at {}".format(DEFAULT_MAX_DEPTH))
+    parser.add_argument("--no-tco", action="store_true",
+                        help="give every call its own activation record, tail calls included")
+    parser.add_argument("--memoize", action="store_true",
+                        help="skip calls of pure functions with arguments already seen (tree and stack engines)")
+    parser.add_argument("--memo-size", type=int, default=128, metavar="N",
+                        help="calls remembered per pure function, least recently used first out")
+    parser.add_argument("--memo-stats", action="store_true", help="report memo hits and misses on stderr")
+    parser.add_argument("--jit-threshold", type=int, metavar="CALLS",
+                        help="compile a function body to Python after this many calls (tree engine)")
+    parser.add_argument("--jit-dump", action="store_true", help="print the Python generated for hot functions")
+    parser.add_argument("--stats", nargs="?", const="-", metavar="PATH",
+                        help="write phase timings, memory peaks, token/node counts and call depth as JSON "
+                             "to PATH, or stderr")
+    parser.add_argument("--stats-no-memory", action="store_true",
+                        help="leave tracemalloc off in --stats, timings are then not inflated by it")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every function and count node visits (tree engine), report on stderr")
+    parser.add_argument("--profile-dump", type=str, metavar="PATH",
+                        help="also save the profile, as JSON for a .json path, else in pstats format")
+    parser.add_argument("--max-nodes", type=int, metavar="N",
+                        help="stop with a BudgetError after N evaluated nodes (tree and stack engines)")
+    parser.add_argument("--max-string", type=int, metavar="CHARS", help="longest string + or * may build")
+    parser.add_argument("--max-alloc", type=int, metavar="CHARS",
+                        help="characters of all strings, and digits of all integers past 64 bits, + - and * build")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS", help="wall clock time a run may take")
+    parser.add_argument("--trace", choices=list(LEVELS), default="off",
+                        help="diagnostics: scope entry/exit, symbol inserts/lookups, nested statement results")
+    parser.add_argument("--trace-file", type=str, help="write diagnostics to this file instead of stdout")
+    parser.add_argument("--trace-buffer", type=int, metavar="N",
+                        help="keep the last N diagnostics in memory and dump them to stderr at exit")
+    parser.add_argument("--no-opt", action="store_true", help="skip constant folding and branch pruning")
+    parser.add_argument("--opt-stats", action="store_true", help="report folded expressions and pruned branches")
+    parser.add_argument("--no-cache", action="store_true", help="always run the front end, don't read or write "
+                        "analyzed programs in " + CACHE_DIR)
+    parser.add_argument("--cache-dir", type=str, help="directory of the analyzed program cache")
+    parser.add_argument("--output-buffer", type=int, default=8192, metavar="CHARS",
+                        help="program output collected before each write, 0 writes every result through")
 
     args = parser.parse_args()
-    parse_file(args.file)
+    configure_trace(args.trace, args.trace_file, args.trace_buffer)
+    buffer_size = args.output_buffer
+    if tracer.level and isinstance(tracer.sink, StdoutSink):
+        buffer_size = 0     # keep results and diagnostics in order on the terminal
+    cache = None
+    if not args.no_cache and tracer.level < TraceLevel.SCOPES:    # front end diagnostics need the front end
+        cache = default_cache(args.file, args.cache_dir)
+    memo = Memoizer(args.memo_size) if args.memoize else None
+    jit = Jit(args.jit_threshold, args.jit_dump) if args.jit_threshold is not None else None
+    profile = Profile(args.file) if args.profile or args.profile_dump else None
+    max_depth = DEFAULT_MAX_DEPTH if args.max_depth is None else args.max_depth
+    budget = request_budget(vars(args))
+    stats = PipelineStats(not args.stats_no_memory) if args.stats else None
+    conflict = option_conflict(args.engine, jit, profile, args.stream, budget)
+    if conflict is not None:
+        parser.error(conflict)
+    if profile is not None and (args.serve or args.batch or args.watch):
+        parser.error("--profile records a single run, not --serve, --batch or --watch")
+    if stats is not None:
+        stats.start()
+    if args.serve:
+        try:
+            serve(args.socket, args.workers,
+                  None if args.no_cache else os.path.abspath(args.cache_dir or CACHE_DIR))
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    if args.batch:
+        paths = batch_files(args.batch)
+        failed = run_batch(paths, args.workers, args.batch_chunk,
+                           None if args.no_cache or not args.cache_dir else os.path.abspath(args.cache_dir),
+                           engine=args.engine, optimize=not args.no_opt,
+                           tco=not args.no_tco, **{name: getattr(args, name) for name in BUDGET_LIMITS})
+        sys.exit(1 if failed else 0)
+    if args.watch:
+        def run(tree):
+            # a fresh memo and jit per run, the bodies they were filled from may have changed
+            execute(tree, engine=args.engine, out=OutputChannel(buffer_size=buffer_size), optimize=not args.no_opt,
+                    opt_stats=args.opt_stats, max_depth=max_depth, tco=not args.no_tco,
+                    memo=Memoizer(args.memo_size) if args.memoize else None,
+                    jit=Jit(args.jit_threshold, args.jit_dump) if args.jit_threshold is not None else None,
+                    budget=request_budget(vars(args)))
+        try:
+            watch(args.file, run, args.watch_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            tracer.sink.close()
+        sys.exit(0)
+    try:
+        if args.stream:
+            stream_file(args.file, engine=args.engine, out=OutputChannel(buffer_size=buffer_size),
+                        optimize=not args.no_opt, max_depth=max_depth, tco=not args.no_tco, jit=jit,
+                        lazy=args.lazy, chunk_size=args.chunk_size, stats=stats, profile=profile, budget=budget)
+        else:
+            parse_file(args.file, lexer=args.lexer, engine=args.engine, out=OutputChannel(buffer_size=buffer_size),
+                       cache=cache, optimize=not args.no_opt, opt_stats=args.opt_stats, max_depth=max_depth,
+                       tco=not args.no_tco, memo=memo, jit=jit, profile=profile, stats=stats,
+                       lazy=args.lazy, budget=budget)
+        if memo is not None and args.memo_stats:
+            print(memo.report(), file=sys.stderr)
+        if profile is not None:
+            print(profile.report(), file=sys.stderr)
+            if args.profile_dump:
+                profile.dump(args.profile_dump)
+        if stats is not None:
+            stats.stop()
+            stats.write(args.stats)
+    except BudgetExceeded as e:
+        print(e, file=sys.stderr)
+        print(json.dumps(dict(e.stats, limit=e.limit)), file=sys.stderr)
+        sys.exit(2)
+    except StackOverflow as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if isinstance(tracer.sink, RingBufferSink):
+            tracer.sink.dump()
+        tracer.sink.close()
 
 # https://github.com/rspivak/lsbasi/blob/master/part19/spi.py
\ No newline at end of file